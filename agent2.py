@@ -7,10 +7,31 @@ import sys
 import time
 
 # You can use the functions from othello_shared to write your AI
-from othello_shared import find_lines, get_possible_moves, get_score, play_move
-
-cache = {}  # Use this for state caching
+from othello_shared import (
+    GAME_OVER,
+    PASS,
+    find_lines,
+    get_game_state,
+    get_possible_moves,
+    get_score,
+    play_move,
+)
+from large_board import evaluate_weights
+from stability import count_stable
+from persistent_cache import evaluation_version
+from search_cache import SearchCache
+from search_runtime import count_node, play_game, reset_gc, search_info, search_stats
+
+# State caching: the transposition table and the move lists, see
+# search_cache.py. compute_heuristic counts the moves of both players
+search_cache = SearchCache(get_game_state, play_move)
+cache = search_cache.entries  # Use this for state caching
 opp_col_d = {1: 2, 2: 1}
+# With caching, look up every child of an alpha-beta node before searching
+# any of them and cut off at once if a cached value already proves the cutoff.
+# Off: on 6x6 boards at depth 8 it saves about 3% of the nodes, but the
+# probes of every child cost more than that
+ENHANCED_TRANSPOSITION_CUTOFFS = False
 
 
 def eprint(*args, **kwargs):  # use this for debugging, to print to sterr
@@ -31,11 +52,11 @@ def compute_utility(board, color):
         return p2_count - p1_count
 
 
-def compute_heuristic(board, color):
+def compute_heuristic(board, color, caching=0):
     # IMPLEMENT! Optional though!
     """
     Method to heuristic value of board, to be used if we are at a depth limit.
-    INPUT: a game state and the player that is in control
+    INPUT: a game state, the player that is in control and the state caching flag of the search
     OUTPUT: an integer that represents heuristic value
 
     SOLUTION EXPLANATION:
@@ -66,26 +87,33 @@ def compute_heuristic(board, color):
     # Calculate basic utility like we have been doing up to now.
     col_util = compute_utility(board, color)
     opp_util = compute_utility(board, opp_col_d[color])
-    # Define best and worst location on the board (using the notion of "stable pieces")
-    corners = [(0,0), (0, len(board)-1), (len(board)-1,0), (len(board[0])-1,len(board)-1)]
-    bad_spots = [(0,1),(1,0),(1,1),(0, len(board)-1-1),(1, len(board)-1),(1, len(board)-1-1),(len(board)-1-1,0), (len(board)-1,1),(len(board)-1-1,1), (len(board)-1-1,len(board)-1),(len(board)-1,len(board)-1-1),(len(board)-1-1,len(board)-1-1)]
-    # Assign extra value for "good" positions and punish with negative value for "undesired" positions
-    for corner in corners:
-        if board[corner[0]][corner[1]] == color:
-            col_util += 4
-        else: 
-            opp_util += 4
-    for spot in bad_spots:
-        if board[spot[0]][spot[1]] == color:
-            col_util -= 2
-        else:
-            opp_util -= 2
+    # Assign extra value to stable pieces, the corners and every disc that
+    # stability spreads to from them (see stability.py)
+    dark_stable, light_stable = count_stable(board)
+    col_stable, opp_stable = (dark_stable, light_stable) if color == 1 else (light_stable, dark_stable)
+    col_util += 2 * col_stable
+    opp_util += 2 * opp_stable
+    # Punish "undesired" positions: the neighbours of a corner that is still
+    # empty, as they give the corner away
+    last = len(board) - 1
+    for row, col in [(0, 0), (0, last), (last, 0), (last, last)]:
+        if board[row][col] != 0:
+            continue
+        row_step = 1 if row == 0 else -1
+        col_step = 1 if col == 0 else -1
+        for spot_row, spot_col in [(row + row_step, col), (row, col + col_step), (row + row_step, col + col_step)]:
+            if board[spot_row][spot_col] == color:
+                col_util -= 2
+            elif board[spot_row][spot_col] == opp_col_d[color]:
+                opp_util -= 2
     # Calculate the number of available moves for each player (using the notion of "mobility")
-    col_util += len(get_possible_moves(board, color))
-    opp_util += len(get_possible_moves(board, opp_col_d[color]))
+    # With state caching the move list of the player to move is usually
+    # cached by the node already
+    game_state = search_cache.game_state if caching != 0 else get_game_state
+    col_util += len(game_state(board, color)[0])
+    opp_util += len(game_state(board, opp_col_d[color])[0])
     return col_util - opp_util
 
-
 ############ MINIMAX ###############################
 def minimax_min_node(board, color, limit, caching=0):
     # IMPLEMENT!
@@ -98,12 +126,17 @@ def minimax_min_node(board, color, limit, caching=0):
     # 3. If not, for each possible move, get the max utiltiy
     # 4. After checking every move, you can find the minimum utility
     # ...
-    if caching != 0 and (board, color) in cache:
-        return cache[(board, color)]
     opp_color = opp_col_d[color]
-    successor_moves = get_possible_moves(board, opp_color)
-    if len(successor_moves) == 0 or (limit == 0):
-        return (None, compute_heuristic(board, color))
+    if caching != 0 and limit != 0:  # Leaves are never stored, nothing to find
+        entry = search_cache.probe(board, color, opp_color, float("-inf"), float("inf"), limit)
+        if entry is not None:
+            return entry[:2]
+    count_node()
+    successor_moves, state = search_cache.game_state(board, opp_color) if caching != 0 else get_game_state(board, opp_color)
+    if state == GAME_OVER or (limit == 0):
+        return (None, compute_heuristic(board, color, caching))
+    elif state == PASS:  # The opponent passes, we move again on the same board
+        min_move, min_util = (None, minimax_max_node(board, color, limit - 1, caching)[1])
     else:
         min_move = None
         min_util = float("inf")
@@ -113,8 +146,8 @@ def minimax_min_node(board, color, limit, caching=0):
             if min_util > next_util:
                 min_util = next_util
                 min_move = move
-            if caching != 0:
-                cache[(next_board_state, color)] = (next_move, next_util)
+    if caching != 0:
+        search_cache.store(board, color, opp_color, min_move, min_util, limit, float("-inf"), float("inf"))
     return (min_move, min_util)
 
 
@@ -129,11 +162,16 @@ def minimax_max_node(board, color, limit, caching=0):
     # 3. If not, for each possible move, get the min utiltiy
     # 4. After checking every move, you can find the maximum utility
     # ...
-    if caching != 0 and (board, color) in cache:
-        return cache[(board, color)]
-    successor_moves = get_possible_moves(board, color)
-    if len(successor_moves) == 0 or (limit == 0):
-        return (None, compute_heuristic(board, color))
+    if caching != 0 and limit != 0:  # Leaves are never stored, nothing to find
+        entry = search_cache.probe(board, color, color, float("-inf"), float("inf"), limit)
+        if entry is not None:
+            return entry[:2]
+    count_node()
+    successor_moves, state = search_cache.game_state(board, color) if caching != 0 else get_game_state(board, color)
+    if state == GAME_OVER or (limit == 0):
+        return (None, compute_heuristic(board, color, caching))
+    elif state == PASS:  # We pass, the opponent moves again on the same board
+        max_move, max_util = (None, minimax_min_node(board, color, limit - 1, caching)[1])
     else:
         max_move = None
         max_util = float("-inf")
@@ -143,8 +181,8 @@ def minimax_max_node(board, color, limit, caching=0):
             if max_util < next_util:
                 max_util = next_util
                 max_move = move
-            if caching != 0:
-                cache[(next_board_state, color)] = (next_move, next_util)
+    if caching != 0:
+        search_cache.store(board, color, color, max_move, max_util, limit, float("-inf"), float("inf"))
     return (max_move, max_util)
 
 
@@ -161,7 +199,9 @@ def select_move_minimax(board, color, limit, caching=0):
     INPUT: a game state, the player that is in control, the depth limit for the search, and a flag determining whether state caching is on or not
     OUTPUT: a tuple of integers (i,j) representing a move, where i is the column and j is the row on the board.
     """
-    return minimax_max_node(board, color, limit, caching)[0]
+    move, util = minimax_max_node(board, color, limit, caching)
+    search_info["move"], search_info["score"] = move, util
+    return move
 
 
 ############ ALPHA-BETA PRUNING #####################
@@ -170,33 +210,48 @@ def alphabeta_min_node(board, color, alpha, beta, limit, caching=0, ordering=0):
     """
     A helper function for alpha-beta that finds the lowest possible utility (don't forget to utilize and update alpha and beta!)
     """
-    if caching != 0 and (board, color) in cache:
-        return cache[(board, color)]
     opp_color = opp_col_d[color]
-    successor_moves = get_possible_moves(board, opp_color)
-    if len(successor_moves) == 0 or (limit == 0):
-        return (None, compute_heuristic(board, color))
+    if caching != 0 and limit != 0:  # Leaves are never stored, nothing to find
+        entry = search_cache.probe(board, color, opp_color, alpha, beta, limit)
+        if entry is not None:
+            return entry[:2]
+    count_node()
+    successor_moves, state = search_cache.game_state(board, opp_color) if caching != 0 else get_game_state(board, opp_color)
+    if state == GAME_OVER or (limit == 0):
+        return (None, compute_heuristic(board, color, caching))
+    original_beta = beta
+    if state == PASS:  # The opponent passes, we move again on the same board
+        min_move, min_util = (None, alphabeta_max_node(board, color, alpha, beta, limit - 1, caching)[1])
     else:
-        if ordering == 1:    
-            node_ordering = []
-            for move in successor_moves:
-                node_ordering.append((move, compute_heuristic(play_move(board, opp_color, move[0], move[1]), color)))
-            node_ordering.sort(key=lambda x: x[1])
-            successor_moves = [item[0] for item in node_ordering]
-        min_move = None
-        min_util = float("inf")
-        for move in successor_moves:
-            next_board_state = play_move(board, opp_color, move[0], move[1])
-            next_move, next_util = alphabeta_max_node(next_board_state, color, alpha, beta, limit - 1, caching)
-            if min_util > next_util:
-                if next_util < beta:
-                    beta = next_util
-                min_util = next_util
-                min_move = move
-            if caching != 0:
-                cache[(next_board_state, color)] = (next_move, next_util)
-            if alpha >= beta:
-                return (min_move, min_util)
+        # Only ordering and ETC need every child board up front
+        children = ((move, play_move(board, opp_color, move[0], move[1])) for move in successor_moves)
+        if ordering == 1 or (caching != 0 and ENHANCED_TRANSPOSITION_CUTOFFS):
+            children = list(children)
+        if ordering == 1:
+            children.sort(key=lambda child: compute_heuristic(child[1], color, caching))
+            best_move = search_cache.best_move(board, color, opp_color) if caching != 0 else None
+            if best_move is not None:
+                # The best move of an earlier, shallower search goes first
+                children.sort(key=lambda child: child[0] != best_move)
+        cutoff = None
+        if caching != 0 and ENHANCED_TRANSPOSITION_CUTOFFS:
+            cutoff = search_cache.transposition_cutoff(children, color, color, alpha, beta, limit - 1, False)
+        if cutoff is not None:
+            min_move, min_util = cutoff
+        else:
+            min_move = None
+            min_util = float("inf")
+            for move, next_board_state in children:
+                next_move, next_util = alphabeta_max_node(next_board_state, color, alpha, beta, limit - 1, caching)
+                if min_util > next_util:
+                    if next_util < beta:
+                        beta = next_util
+                    min_util = next_util
+                    min_move = move
+                if alpha >= beta:
+                    break
+    if caching != 0:
+        search_cache.store(board, color, opp_color, min_move, min_util, limit, alpha, original_beta)
     return (min_move, min_util)
 
 def alphabeta_max_node(board, color, alpha, beta, limit, caching=0, ordering=0):
@@ -204,32 +259,47 @@ def alphabeta_max_node(board, color, alpha, beta, limit, caching=0, ordering=0):
     """
     A helper function for alpha-beta that finds the highest possible utility (don't forget to utilize and update alpha and beta!)
     """
-    if caching != 0 and (board, color) in cache:
-        return cache[(board, color)]
-    successor_moves = get_possible_moves(board, color)
-    if (len(successor_moves) == 0) or (limit == 0):
-        return (None, compute_heuristic(board, color))
+    if caching != 0 and limit != 0:  # Leaves are never stored, nothing to find
+        entry = search_cache.probe(board, color, color, alpha, beta, limit)
+        if entry is not None:
+            return entry[:2]
+    count_node()
+    successor_moves, state = search_cache.game_state(board, color) if caching != 0 else get_game_state(board, color)
+    if state == GAME_OVER or (limit == 0):
+        return (None, compute_heuristic(board, color, caching))
+    original_alpha = alpha
+    if state == PASS:  # We pass, the opponent moves again on the same board
+        max_move, max_util = (None, alphabeta_min_node(board, color, alpha, beta, limit - 1, caching)[1])
     else:
+        # Only ordering and ETC need every child board up front
+        children = ((move, play_move(board, color, move[0], move[1])) for move in successor_moves)
+        if ordering == 1 or (caching != 0 and ENHANCED_TRANSPOSITION_CUTOFFS):
+            children = list(children)
         if ordering == 1:
-            node_ordering = []
-            for move in successor_moves:
-                node_ordering.append((move, compute_heuristic(play_move(board, color, move[0], move[1]), color)))
-            node_ordering.sort(reverse=True, key=lambda x: x[1])
-            successor_moves = [item[0] for item in node_ordering]
-        max_move = None
-        max_util = float("-inf")
-        for move in successor_moves:
-            next_board_state = play_move(board, color, move[0], move[1])
-            next_move, next_util = alphabeta_min_node(next_board_state, color, alpha, beta, limit - 1, caching)
-            if max_util < next_util:
-                if alpha < next_util:
-                    alpha = next_util
-                max_util = next_util
-                max_move = move
-            if caching != 0:
-                cache[(next_board_state, color)] = (next_move, next_util)
-            if alpha >= beta:
-                return (max_move, max_util)
+            children.sort(reverse=True, key=lambda child: compute_heuristic(child[1], color, caching))
+            best_move = search_cache.best_move(board, color, color) if caching != 0 else None
+            if best_move is not None:
+                # The best move of an earlier, shallower search goes first
+                children.sort(key=lambda child: child[0] != best_move)
+        cutoff = None
+        if caching != 0 and ENHANCED_TRANSPOSITION_CUTOFFS:
+            cutoff = search_cache.transposition_cutoff(children, color, opp_col_d[color], alpha, beta, limit - 1, True)
+        if cutoff is not None:
+            max_move, max_util = cutoff
+        else:
+            max_move = None
+            max_util = float("-inf")
+            for move, next_board_state in children:
+                next_move, next_util = alphabeta_min_node(next_board_state, color, alpha, beta, limit - 1, caching)
+                if max_util < next_util:
+                    if alpha < next_util:
+                        alpha = next_util
+                    max_util = next_util
+                    max_move = move
+                if alpha >= beta:
+                    break
+    if caching != 0:
+        search_cache.store(board, color, color, max_move, max_util, limit, original_alpha, beta)
     return (max_move, max_util)
 
 def select_move_alphabeta(board, color, limit=-1, caching=0, ordering=0):
@@ -249,7 +319,9 @@ def select_move_alphabeta(board, color, limit=-1, caching=0, ordering=0):
     """
     alpha = float("-inf")
     beta = float("inf")
-    return alphabeta_max_node(board, color, alpha, beta, limit, caching, ordering)[0]
+    move, util = alphabeta_max_node(board, color, alpha, beta, limit, caching, ordering)
+    search_info["move"], search_info["score"] = move, util
+    return move
 
 ####################################################
 def run_ai():
@@ -259,13 +331,34 @@ def run_ai():
     Then it repeatedly receives the current score and current board state until the game is over.
     """
     print("Othello AI")  # First line is the name of this AI
-    arguments = input().split(",")
-
+    while True:
+        play_one_game(input().split(","))
+
+        # A pooled AI is kept alive between games (see agent_pool.py): after
+        # FINAL the manager sends RESET and waits for the name line again
+        try:
+            command = input()
+        except EOFError:
+            break
+        if command.strip() != "RESET":
+            break
+        search_cache.clear()
+        reset_gc()
+        search_stats["nodes"] = 0
+        print("Othello AI")
+
+
+def play_one_game(arguments):
+    """
+    Play a single game with the configuration line sent by the manager,
+    returning once the game is over.
+    """
     color = int(arguments[0])  # Player color: 1 for dark (goes first), 2 for light.
     limit = int(arguments[1])  # Depth limit
     minimax = int(arguments[2])  # Minimax or alpha beta
     caching = int(arguments[3])  # Caching
     ordering = int(arguments[4])  # Node-ordering (for alpha-beta only)
+    options = dict(argument.split("=", 1) for argument in arguments[5:])  # key=value, see search_runtime.play_game
 
     if minimax == 1:
         eprint("Running MINIMAX")
@@ -290,34 +383,8 @@ def run_ai():
     if minimax == 1 and ordering == 1:
         eprint("Node Ordering should have no impact on Minimax")
 
-    while True:  # This is the main loop
-        # Read in the current game status, for example:
-        # "SCORE 2 2" or "FINAL 33 31" if the game is over.
-        # The first number is the score for player 1 (dark), the second for player 2 (light)
-        next_input = input()
-        status, dark_score_s, light_score_s = next_input.strip().split()
-        dark_score = int(dark_score_s)
-        light_score = int(light_score_s)
-
-        if status == "FINAL":  # Game is over.
-            print
-        else:
-            board = eval(input())  # Read in the input and turn it into a Python
-            # object. The format is a list of rows. The
-            # squares in each row are represented by
-            # 0 : empty square
-            # 1 : dark disk (player 1)
-            # 2 : light disk (player 2)
-
-            # Select the move and send it to the manager
-            if minimax == 1:  # run this if the minimax flag is given
-                movei, movej = select_move_minimax(board, color, limit, caching)
-            else:  # else run alphabeta
-                movei, movej = select_move_alphabeta(
-                    board, color, limit, caching, ordering
-                )
-
-            print("{} {}".format(movei, movej))
+    play_game(color, limit, minimax, caching, ordering, options, select_move_minimax, select_move_alphabeta,
+              search_cache, evaluation_version(compute_heuristic, compute_utility), evaluate=evaluate_weights)
 
 
 if __name__ == "__main__":
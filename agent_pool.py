@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+A pool of pre-started AI processes for tournaments with many short games.
+
+Starting an AI costs a fresh interpreter, its imports and whatever it
+precomputes before printing its name. The pool starts its processes ahead
+of time and hands a warm one to each new game. When the game ends the pool
+sends FINAL followed by RESET; an AI that supports reuse clears its per-game
+state and prints its name again, and goes back into the pool. An AI that
+exits instead (e.g. Randy) is simply replaced by a new process.
+
+    pool = AgentPool("agent.py", size=2)
+    p1 = pool.acquire(1, limit)
+    p2 = AiPlayerInterface("randy_ai.py", 2, limit)
+    play_game(OthelloGameManager(6), p1, p2)  # p1.kill() returns it to the pool
+    pool.close()
+
+Run this module to compare per-game startup latency with and without a
+pool:
+    python3 agent_pool.py [-n <games>] [-s <pool-size>] <agent>
+"""
+import sys, getopt
+import statistics
+import subprocess
+import time
+from threading import Timer
+
+from othello_game import AiPlayerInterface, OthelloGameManager
+from othello_shared import get_score
+
+
+class AgentPool(object):
+
+    RESET_TIMEOUT = 10
+
+    def __init__(self, filename, size = 2):
+        self.filename = filename
+        self.size = size
+        self.idle = [] # (process, name) pairs, name is None until it was read
+        for k in range(size):
+            self.idle.append(self.spawn())
+
+    def spawn(self):
+        return subprocess.Popen(['python3', self.filename], stdin=subprocess.PIPE, stdout=subprocess.PIPE), None
+
+    def acquire(self, color, limit, minimax = False, caching = False, ordering = False, time_control = None, options = None):
+        """
+        Return an AiPlayerInterface for a new game, backed by a warm process
+        if one is idle. The process comes back with release().
+        """
+        process, name = self.idle.pop(0) if self.idle else self.spawn()
+        player = AiPlayerInterface(self.filename, color, limit, minimax, caching, ordering, process, name, time_control, options = options)
+        player.pool = self
+        return player
+
+    def release(self, player, manager):
+        """
+        End the game for player and return its process to the pool if the AI
+        acknowledges RESET by printing its name again.
+        """
+        process = player.process
+        dark_score, light_score = get_score(manager.board)
+        timer = Timer(AgentPool.RESET_TIMEOUT, process.kill)
+        timer.start()
+        try:
+            process.stdin.write("FINAL {} {}\nRESET\n".format(dark_score, light_score).encode("ASCII"))
+            process.stdin.flush()
+            reused = process.stdout.readline().decode("ASCII").strip() == player.name
+        except OSError:
+            reused = False
+        timer.cancel()
+        if reused:
+            self.idle.insert(0, (process, player.name))
+        else:
+            process.kill()
+            if len(self.idle) < self.size:
+                self.idle.append(self.spawn())
+
+    def close(self):
+        for process, name in self.idle:
+            process.kill()
+        self.idle = []
+
+
+def measure_startup(filename, n_games, pool_size):
+    """
+    Return the per-game overhead in seconds of starting an AI until it has
+    its configuration and ending it after FINAL, once spawning a new process
+    per game and once using a pool.
+    """
+    game = OthelloGameManager(4)
+    cold = []
+    for k in range(n_games):
+        start = time.perf_counter()
+        player = AiPlayerInterface(filename, 1, 1)
+        player.kill(game)
+        cold.append(time.perf_counter() - start)
+
+    pool = AgentPool(filename, pool_size)
+    time.sleep(1) # let the pool start up, as it would before a tournament
+    warm = []
+    for k in range(n_games):
+        start = time.perf_counter()
+        player = pool.acquire(1, 1)
+        player.kill(game)
+        warm.append(time.perf_counter() - start)
+    pool.close()
+    return cold, warm
+
+
+def main(argv):
+
+    n_games = 20
+    pool_size = 2
+    usage = 'agent_pool.py [-n <games> -s <pool-size>] <agent>'
+
+    try:
+        opts, args = getopt.getopt(argv,"hn:s:",["games=","size="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-n", "--games"):
+            n_games = int(arg)
+        elif opt in ("-s", "--size"):
+            pool_size = int(arg)
+    if not args:
+        print(usage)
+        sys.exit(2)
+
+    cold, warm = measure_startup(args[0], n_games, pool_size)
+    for name, times in (("new process", cold), ("pool", warm)):
+        print("{:12} median {:7.2f} ms, max {:7.2f} ms".format(name, statistics.median(times) * 1000, max(times) * 1000))
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+An asyncio version of the game manager for running many matches between AI
+subprocesses from one process. It speaks the same protocol as
+AiPlayerInterface, but waits for moves with asyncio.wait_for instead of a
+blocking readline and a Timer thread, so a match costs no thread while the
+AIs think.
+
+    results = asyncio.run(run_matches(100, "agent.py", "randy_ai.py", 6, 2))
+
+Every match holds two subprocesses with three pipes each, keep the
+concurrency below the open file limit (ulimit -n).
+
+Run this module to compare throughput with the thread-per-game approach:
+    python3 async_game.py [-n <games> -j <concurrency> -d <dimension>
+                           -a <agentA> -b <agentB> -l <depth-limit>]
+"""
+import sys, getopt
+import asyncio
+import contextlib
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from othello_game import AiPlayerInterface, AiTimeoutError, OthelloGameManager, TimeControl, play_game
+from othello_shared import PASS, GAME_OVER, get_score
+
+
+class AsyncAiPlayerInterface(object):
+
+    FINAL_TIMEOUT = AiPlayerInterface.FINAL_TIMEOUT
+
+    def __init__(self, process, name, color, clock, timed = False):
+        self.process = process
+        self.name = name
+        self.color = color
+        self.clock = clock
+        self.timed = timed  # whether SCORE lines carry the seconds left, see AiPlayerInterface.get_move
+
+    @classmethod
+    async def start(cls, filename, color, limit, minimax = False, caching = False, ordering = False, time_control = None, options = None, stderr = asyncio.subprocess.DEVNULL):
+        process = await asyncio.create_subprocess_exec('python3', filename, stdin=asyncio.subprocess.PIPE,
+                                                       stdout=asyncio.subprocess.PIPE, stderr=stderr)
+        name = (await process.stdout.readline()).decode("ASCII").strip()
+        clock = TimeControl.from_string(time_control or "move:{}".format(AiPlayerInterface.TIMEOUT))
+        options = dict(options or {})
+        if time_control is not None:
+            options["time"] = clock
+        extra = "".join(",{}={}".format(key, value) for key, value in options.items())
+        process.stdin.write("{},{},{},{},{}{}\n".format(color, limit, int(minimax), int(caching), int(ordering), extra).encode("ASCII"))
+        await process.stdin.drain()
+        return cls(process, name, color, clock, time_control is not None)
+
+    async def get_move(self, manager):
+        dark_score, light_score = get_score(manager.board)
+        budget = self.clock.budget()
+        score_line = "SCORE {} {}".format(dark_score, light_score)
+        if self.timed:
+            score_line += " {:.3f}".format(budget)
+        self.process.stdin.write("{}\n{}\n".format(score_line, str(manager.board)).encode("ASCII"))
+        await self.process.stdin.drain()
+        start = time.perf_counter()
+        try:
+            move_s = await asyncio.wait_for(self.process.stdout.readline(), budget)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            raise AiTimeoutError
+        self.clock.charge(time.perf_counter() - start)
+        i_s, j_s = move_s.decode("ASCII").strip().split()
+        return int(i_s), int(j_s)
+
+    async def kill(self, manager):
+        dark_score, light_score = get_score(manager.board)
+        try:
+            self.process.stdin.write("FINAL {} {}\n".format(dark_score, light_score).encode("ASCII"))
+            self.process.stdin.close()
+            await asyncio.wait_for(self.process.wait(), self.FINAL_TIMEOUT)
+        except (OSError, asyncio.TimeoutError):
+            pass
+        if self.process.returncode is None:
+            self.process.kill()
+            await self.process.wait()
+
+
+async def play_game_async(game, player1, player2):
+    """
+    Play a game to the end like othello_game.play_game, without printing.
+    Returns the final (dark, light) score and the player that timed out, if
+    any.
+    """
+    players = [None, player1, player2]
+    timed_out = None
+    while True:
+        possible_moves, state = game.get_game_state()
+        if state == GAME_OVER:
+            break
+        elif state == PASS:
+            game.pass_turn()
+            continue
+        player_obj = players[game.current_player]
+        try:
+            i, j = await player_obj.get_move(game)
+        except AiTimeoutError:
+            timed_out = player_obj
+            break
+        game.play(i, j)
+    await asyncio.gather(player1.kill(game), player2.kill(game))
+    return get_score(game.board), timed_out
+
+
+async def run_matches(n_games, agent1, agent2, dimension, limit, concurrency = 100, minimax = False, caching = False, ordering = False, time_control = None, options = None):
+    """
+    Play n_games between agent1 (dark) and agent2 (light) with at most
+    concurrency games running at once, returning the list of results of
+    play_game_async. options are key=value settings added to the
+    configuration line of both agents.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def match():
+        async with semaphore:
+            player1, player2 = await asyncio.gather(
+                AsyncAiPlayerInterface.start(agent1, 1, limit, minimax, caching, ordering, time_control, options),
+                AsyncAiPlayerInterface.start(agent2, 2, limit, minimax, caching, ordering, time_control, options))
+            return await play_game_async(OthelloGameManager(dimension), player1, player2)
+
+    return await asyncio.gather(*[match() for k in range(n_games)])
+
+
+def run_matches_threaded(n_games, agent1, agent2, dimension, limit, concurrency, options = None):
+    """
+    The thread-per-game baseline: play_game with blocking AiPlayerInterfaces
+    on a thread pool.
+    """
+    def match(k):
+        player1 = AiPlayerInterface(agent1, 1, limit, options = options)
+        player2 = AiPlayerInterface(agent2, 2, limit, options = options)
+        play_game(OthelloGameManager(dimension), player1, player2)
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        with ThreadPoolExecutor(concurrency) as executor:
+            list(executor.map(match, range(n_games)))
+
+
+def main(argv):
+
+    n_games = 100
+    concurrency = 50
+    size = 6
+    limit = 2
+    agent1 = "agent.py"
+    agent2 = "randy_ai.py"
+    options = {}
+    usage = 'async_game.py [-n <games> -j <concurrency> -d <dimension> -a <agentA> -b <agentB> -l <depth-limit> -p <key>=<value> ...]'
+
+    try:
+        opts, args = getopt.getopt(argv,"hn:j:d:a:b:l:p:",["games=","concurrency=","dimension=","agent1=","agent2=","limit=","option="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-n", "--games"):
+            n_games = int(arg)
+        elif opt in ("-j", "--concurrency"):
+            concurrency = int(arg)
+        elif opt in ("-d", "--dimension"):
+            size = int(arg)
+        elif opt in ("-a", "--agent1"):
+            agent1 = arg
+        elif opt in ("-b", "--agent2"):
+            agent2 = arg
+        elif opt in ("-l", "--limit"):
+            limit = int(arg)
+        elif opt in ("-p", "--option"): # passed to both agents, e.g. -p workers=4
+            key, _, value = arg.partition("=")
+            options[key] = value
+
+    start = time.perf_counter()
+    results = asyncio.run(run_matches(n_games, agent1, agent2, size, limit, concurrency, options = options))
+    async_time = time.perf_counter() - start
+    dark_wins = sum(1 for (dark, light), timed_out in results if dark > light)
+    print("asyncio: {} games in {:.1f}s ({:.2f} games/s), dark won {}".format(n_games, async_time, n_games / async_time, dark_wins))
+
+    start = time.perf_counter()
+    run_matches_threaded(n_games, agent1, agent2, size, limit, concurrency, options)
+    thread_time = time.perf_counter() - start
+    print("threads: {} games in {:.1f}s ({:.2f} games/s)".format(n_games, thread_time, n_games / thread_time))
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
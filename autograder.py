@@ -1,23 +1,28 @@
 #!/usr/bin/env python
+import asyncio
+import contextlib
+import io
 import os  # for time functions
+import random
+import subprocess
+import sys
+import tempfile
 
 # import student's functions
 from agent import *
-
-# boards of size 4
-smallboards = [((0, 0, 0, 0), (0, 2, 1, 0), (0, 1, 1, 1), (0, 0, 0, 0)),
-((0, 1, 0, 0), (0, 1, 1, 0), (0, 1, 2, 1), (0, 0, 0, 2)),
-((0, 0, 0, 0), (0, 2, 1, 0), (0, 1, 1, 1), (0, 1, 1, 0)),
-((0, 1, 0, 0), (0, 2, 2, 0), (0, 1, 2, 1), (0, 0, 2, 2)),
-((1, 0, 0, 2), (1, 1, 2, 0), (1, 1, 1, 1), (1, 2, 2, 2)),
-((0, 1, 0, 0), (0, 1, 1, 0), (2, 2, 2, 1), (0, 0, 0, 2))]
-
-# boards of size 6
-bigboards = [((0, 0, 0, 0, 0, 0), (0, 0, 2, 2, 0, 0), (0, 1, 1, 2, 2, 0), (2, 2, 1, 2, 0, 0), (0, 1, 0, 1, 2, 0), (0, 0, 0, 0, 0, 0)),
-((0, 0, 0, 0, 0, 0), (0, 0, 1, 2, 0, 0), (0, 1, 1, 1, 1, 0), (2, 2, 1, 2, 0, 0), (0, 1, 0, 1, 2, 0), (0, 0, 0, 0, 0, 0)),
-((0, 0, 0, 0, 1, 0), (0, 0, 1, 1, 0, 0), (0, 1, 1, 1, 1, 0), (2, 2, 1, 2, 0, 0), (0, 2, 0, 1, 2, 0), (0, 0, 2, 2, 1, 0)),
-((0, 0, 0, 0, 0, 0), (0, 0, 0, 2, 0, 0), (0, 1, 2, 2, 2, 0), (0, 2, 2, 2, 0, 0), (0, 1, 0, 0, 0, 0), (0, 0, 0, 0, 0, 0)),
-((0, 0, 0, 0, 0, 0), (0, 0, 0, 2, 0, 0), (0, 1, 2, 1, 1, 0), (0, 2, 2, 2, 0, 0), (0, 1, 0, 0, 0, 0), (0, 0, 0, 0, 0, 0))]
+import agent  # to switch module flags such as STABILITY_CUTOFFS
+import agent2  # for the version of its cache file section
+from othello_shared import PLAYING, PASS, GAME_OVER, get_game_state, available_backends, load_backend
+from perft import batch_conformance, conformance, random_positions
+from persistent_cache import load_cache, load_sections
+from async_game import AsyncAiPlayerInterface
+from othello_game import AiPlayerInterface, OthelloGameManager
+import large_board
+import mcts_agent
+from stability import count_stable
+
+# boards of size 4 and 6, shared with test_runner.py
+from test_runner import smallboards, bigboards
 
 #Select what to test
 test_compute_utility = True
@@ -34,6 +39,12 @@ test_ordering = True
 test_select_move_minimax = True
 test_select_move_alphabeta = True
 test_select_move_equal = True
+test_pass_handling = True
+test_backends = True
+test_mcts = True
+test_stability = True
+test_large_boards = True
+test_protocol = True
 
 if test_compute_utility:
 
@@ -52,7 +63,7 @@ if test_compute_utility:
 
 if test_select_move_minimax:
     correctmoves_1 = [(0,0),(2,3),(0,0),(3,0),(3,1),(0,3)] # utilityvalues = [6,-5,8,-4,4,-2]
-    correctmoves_2 = [(3,3),(0,0),(3,3),(0,2),(3,1),(0,0)] # utilityvalues = [1,3,0,9,2,2]
+    correctmoves_2 = [(3,3),(3,1),(3,3),(0,2),(3,1),(0,0)] # utilityvalues = [1,9,0,9,2,2]
     correct = 0
     for i in range(0,len(smallboards)):
       board = smallboards[i]
@@ -65,7 +76,7 @@ if test_select_move_minimax:
 
 if test_select_move_alphabeta:
     correctmoves_1 = [(0,0),(2,3),(0,0),(3,0),(3,1),(0,3)] # utilityvalues = [6,-5,8,-4,4,-2]
-    correctmoves_2 = [(3,3),(0,0),(3,3),(0,2),(3,1),(0,0)] # utilityvalues = [1,3,0,9,2,2]
+    correctmoves_2 = [(3,3),(3,1),(3,3),(0,2),(3,1),(0,0)] # utilityvalues = [1,9,0,9,2,2]
     correct = 0
     for i in range(0,len(smallboards)):
       board = smallboards[i]
@@ -78,7 +89,7 @@ if test_select_move_alphabeta:
   
 if test_select_move_equal:
     correctmoves_1 = [(0,0),(2,3),(0,0),(3,0),(3,1)]
-    correctmoves_2 = [(3,3),(0,0),(3,3),(0,2),(3,1)]
+    correctmoves_2 = [(3,3),(3,1),(3,3),(0,2),(3,1)]
     correct = 0
     for i in range(0,len(correctmoves_1)):
       board = smallboards[i]
@@ -92,6 +103,209 @@ if test_select_move_equal:
     print('Testing Minimax and Alphabeta Moves Equality (with Depth Limit of 6)')
     print("You computed correct moves for {} of {} tests!\n".format(correct, len(correctmoves_1)))
 
+if test_pass_handling:
+
+    print('Testing Pass Handling')
+    # Dark cannot move but light can, so dark must pass instead of ending the game
+    pass_board = ((2, 0, 1, 1), (1, 1, 1, 1), (2, 2, 2, 2), (1, 1, 2, 2))
+    full_board = ((1, 1, 1, 1), (1, 1, 1, 1), (2, 2, 2, 2), (2, 2, 2, 2))
+    correct = 0
+    if get_game_state(smallboards[0], 1) == ([(0, 0), (0, 1), (1, 0)], PLAYING):
+      correct += 1
+    if get_game_state(pass_board, 1) == ([], PASS) and get_game_state(pass_board, 2) == ([(1, 0)], PLAYING):
+      correct += 1
+    if get_game_state(full_board, 1) == ([], GAME_OVER):
+      correct += 1
+    if minimax_max_node(pass_board, 1, 2) == (None, -4) and alphabeta_max_node(pass_board, 1, float("-Inf"), float("Inf"), 2) == (None, -4):
+      correct += 1
+    print("You handled passes and game over correctly in {} of {} tests!".format(correct, 4))
+
+    # A pass ply uses up one unit of the depth limit, so passes can only add a
+    # single node per pass to the tree. Node counts with depth limit 6 for
+    # [minimax, alpha-beta], dark and light on every small board:
+    max_nodes = [[4, 4], [1373, 554], [105, 79], [645, 181], [4, 4], [489, 299],
+                 [339, 154], [429, 203], [19, 16], [10, 10], [629, 74], [578, 207]]
+    check = 0
+    for i in range(0,len(smallboards)):
+      for color in [1, 2]:
+        limits = max_nodes[2*i + color - 1]
+        search_stats["nodes"] = 0
+        minimax_max_node(smallboards[i], color, 6)
+        minimax_nodes = search_stats["nodes"]
+        search_stats["nodes"] = 0
+        alphabeta_max_node(smallboards[i], color, float("-Inf"), float("Inf"), 6)
+        alphabeta_nodes = search_stats["nodes"]
+        if minimax_nodes <= limits[0] and alphabeta_nodes <= limits[1]:
+          check += 1
+    print("Node counts stayed within bounds for {} of {} searches!\n".format(check, len(max_nodes)))
+
+if test_protocol:
+
+    print('Testing the Manager Protocol')
+    # An AI that logs the SCORE lines it gets and plays its first legal move.
+    # SCORE lines end with the seconds left only when a time control was
+    # requested, AIs written to the original protocol read three fields
+    folder = tempfile.mkdtemp()
+    log_path = os.path.join(folder, "score_lines.txt")
+    recorder = os.path.join(folder, "recorder_ai.py")
+    with open(recorder, "w") as f:
+      f.write("\n".join([
+        "import sys",
+        "sys.path.insert(0, {!r})".format(os.path.dirname(os.path.abspath(__file__))),
+        "from othello_shared import get_possible_moves",
+        "print('Recorder')",
+        "sys.stdout.flush()",
+        "color = int(input().split(',')[0])",
+        "while True:",
+        "    line = input()",
+        "    with open({!r}, 'a') as log:".format(log_path),
+        "        log.write(line + '\\n')",
+        "    if line.startswith('FINAL'):",
+        "        break",
+        "    board = eval(input())",
+        "    print('{} {}'.format(*get_possible_moves(board, color)[0]))",
+        "    sys.stdout.flush()",
+        ""]))
+
+    async def async_move(time_control):
+      player = await AsyncAiPlayerInterface.start(recorder, 1, 2, time_control = time_control)
+      game = OthelloGameManager(4)
+      await player.get_move(game)
+      await player.kill(game)
+
+    def score_fields(play):
+      if os.path.exists(log_path):
+        os.remove(log_path)
+      with contextlib.redirect_stdout(io.StringIO()):
+        play()
+      with open(log_path) as log:
+        return [len(line.split()) for line in log if line.startswith("SCORE")]
+
+    def sync_move(time_control):
+      player = AiPlayerInterface(recorder, 1, 2, time_control = time_control)
+      game = OthelloGameManager(4)
+      player.get_move(game)
+      player.kill(game)
+
+    correct = 0
+    if score_fields(lambda: sync_move(None)) == [3]:
+      correct += 1
+    if score_fields(lambda: sync_move("move:5")) == [4]:
+      correct += 1
+    if score_fields(lambda: asyncio.run(async_move(None))) == [3]:
+      correct += 1
+    if score_fields(lambda: asyncio.run(async_move("move:5"))) == [4]:
+      correct += 1
+    # An agent from before time controls plays a move of an untimed game. It
+    # keeps reading after FINAL, so its process is killed instead
+    game = OthelloGameManager(4)
+    try:
+      with contextlib.redirect_stdout(io.StringIO()):
+        player = AiPlayerInterface("agent_before_nodeordering.py", 1, 2)
+        move = player.get_move(game)
+      player.process.kill()
+      if move in get_possible_moves(game.board, 1):
+        correct += 1
+    except ValueError:
+      pass
+    print("SCORE lines matched the time control in {} of {} tests!\n".format(correct, 5))
+
+if test_backends:
+
+    print('Testing Move Generation Backends')
+    # Every backend must agree with the tuple code on random games of each size
+    names = available_backends()
+    correct = 0
+    for name in names:
+      if conformance(load_backend(name), n_games=3) == 0:
+        correct += 1
+    print("Backends {} agreed with the tuple code in {} of {} tests!".format(", ".join(names), correct, len(names)))
+    if "numpy" in names:
+      print("Batch move generation agreed with the tuple code in {} of {} tests!".format(int(batch_conformance(100) == 0), 1))
+    # The tuple code also takes a board of lists, as it always did, and
+    # returns a board of tuples that does not change with it
+    list_board = [list(row) for row in smallboards[0]]
+    new_board = load_backend("tuples").play_move(list_board, 1, 0, 0)
+    list_board[3][3] = 1
+    check = int(all(type(row) is tuple for row in new_board) and new_board == play_move(smallboards[0], 1, 0, 0))
+    print("The tuple code played a move on a board of lists correctly in {} of {} tests!".format(check, 1))
+    print()
+
+if test_stability:
+
+    print('Testing Stable Discs')
+    correct = 0
+    # Every disc of a full board is stable, none of the opening discs are
+    if count_stable(((1, 1, 1, 1), (1, 1, 1, 1), (2, 2, 2, 2), (2, 2, 2, 2))) == (8, 8):
+      correct += 1
+    if count_stable(((0, 0, 0, 0), (0, 2, 1, 0), (0, 1, 2, 0), (0, 0, 0, 0))) == (0, 0):
+      correct += 1
+    # A corner and the edge discs next to it are stable, a disc on an open diagonal is not
+    if count_stable(((1, 1, 0, 0), (1, 1, 0, 0), (0, 0, 2, 0), (0, 0, 0, 0))) == (3, 0):
+      correct += 1
+    # Stability cutoffs must not change the value of a full-window search
+    values = []
+    for flag in [False, True]:
+      agent.STABILITY_CUTOFFS = flag
+      values.append([alphabeta_max_node(board, color, float("-Inf"), float("Inf"), 6)[1] for board in smallboards for color in [1, 2]])
+    agent.STABILITY_CUTOFFS = False
+    if values[0] == values[1]:
+      correct += 1
+    print("You computed stable discs and stability cutoffs correctly in {} of {} tests!\n".format(correct, 4))
+
+if test_mcts:
+
+    print('Testing MCTS')
+    # Every playout is counted on the root and the chosen move is legal
+    correct = 0
+    tests = 0
+    for board in smallboards:
+      for color in [1, 2]:
+        moves = get_possible_moves(board, color)
+        if not moves:
+          continue
+        tests += 1
+        tree = mcts_agent.Tree(board, color)
+        move = mcts_agent.select_move_mcts(tree, playouts=300, rng=random.Random(0))
+        if move in moves and tree.visits[tree.root] == 300:
+          correct += 1
+    print("MCTS chose legal moves after all its playouts in {} of {} tests!".format(correct, tests))
+    # Parallel searches count the playouts of every worker
+    correct = 0
+    for parallel in ["root", "leaf"]:
+      mcts_agent.search_stats["playouts"] = 0
+      tree = mcts_agent.Tree(bigboards[0], 1)
+      move = mcts_agent.select_move_mcts(tree, playouts=320, rng=random.Random(0), workers=2, parallel=parallel)
+      if move in get_possible_moves(bigboards[0], 1) and mcts_agent.search_stats["playouts"] >= 320:
+        correct += 1
+    for size, pool in mcts_agent.worker_pool:
+      pool.terminate()
+    print("Parallel MCTS chose legal moves in {} of {} tests!\n".format(correct, 2))
+
+if test_large_boards:
+
+    print('Testing Large Boards')
+    # The bitboard search with the disc evaluation must find the values of
+    # alpha-beta on tuple boards
+    correct = 0
+    tests = 0
+    for dimension in [10, 12]:
+      for board, color, move in random_positions(30, dimension)[::10]:
+        dark, light = large_board.to_bitboards(board)
+        own, opp = (dark, light) if color == 1 else (light, dark)
+        for depth in [1, 2, 3]:
+          tests += 1
+          square, value = large_board.search_root(own, opp, depth, dimension, large_board.evaluate_discs)
+          if value == alphabeta_max_node(board, color, float("-Inf"), float("Inf"), depth)[1]:
+            correct += 1
+    print("Large board search matched alpha-beta in {} of {} tests!".format(correct, tests))
+    correct = 0
+    for dimension in [10, 16]:
+      board = random_positions(1, dimension)[0][0]
+      if large_board.select_move_large(board, 1, seconds=0.2) in get_possible_moves(board, 1):
+        correct += 1
+    print("Timed large board search chose legal moves in {} of {} tests!\n".format(correct, 2))
+
 # It is less probable to noice the effect of caching in smaller boards and depth limits
 if test_caching_big:
 
@@ -114,7 +328,97 @@ if test_caching_big:
       if (with_cache == no_cache):
          check_2 += 1
     print("State caching improved the time of alpha-beta for {} of {} boards!".format(check_1, len(bigboards))) 
-    print("Move choices with and without caching are the same for {} of {} boards!\n".format(check_2, len(bigboards)))
+    print("Move choices with and without caching are the same for {} of {} boards!".format(check_2, len(bigboards)))
+
+    # Enhanced transposition cutoffs may only save nodes, never change a result
+    check = 0
+    for board in bigboards:
+      results = []
+      for flag in [False, True]:
+        agent.ENHANCED_TRANSPOSITION_CUTOFFS = flag
+        cache.clear()
+        search_stats["nodes"] = 0
+        value = alphabeta_max_node(board, 1, float("-Inf"), float("Inf"), 5, 1, 1)
+        results.append((value, search_stats["nodes"]))
+      if results[0][0] == results[1][0] and results[1][1] <= results[0][1]:
+        check += 1
+    print("Enhanced transposition cutoffs kept the result with no more nodes for {} of {} boards!".format(check, len(bigboards)))
+
+    # Cached values must match uncached search at every depth, also when the
+    # cache is kept between the iterations of iterative deepening
+    check = 0
+    tests = 0
+    for board in bigboards + smallboards:
+      for ordering in [0, 1]:
+        tests += 1
+        cache.clear()
+        same = True
+        for depth in range(1, 5):
+          expected = alphabeta_max_node(board, 1, float("-Inf"), float("Inf"), depth, 0, ordering)
+          found = alphabeta_max_node(board, 1, float("-Inf"), float("Inf"), depth, 1, ordering)
+          same = same and found[1] == expected[1] and (ordering == 1 or found[0] == expected[0])
+        check += same
+    for board in smallboards:
+      tests += 1
+      cache.clear()
+      same = True
+      for depth in range(1, 4):
+        same = same and minimax_max_node(board, 2, depth, 1) == minimax_max_node(board, 2, depth, 0)
+        same = same and minimax_min_node(board, 2, depth, 1) == minimax_min_node(board, 2, depth, 0)
+      check += same
+    print("Cached search matched uncached search at every depth in {} of {} tests!".format(check, tests))
+
+    # No cache grows past its share of the memory budget
+    check = 0
+    memory = search_cache.memory / 2 ** 20
+    for megabytes in [memory, 0.5]:
+      search_cache.set_memory(megabytes)
+      search_cache.clear()
+      alphabeta_max_node(bigboards[0], 1, float("-Inf"), float("Inf"), 5, 1, 1)
+      limits = search_cache.entry_limits(len(bigboards[0]))
+      if len(cache) <= limits[2] and len(search_cache.move_lists) <= limits[3] and search_cache.memory_used() <= search_cache.memory:
+        check += 1
+    search_cache.set_memory(memory)
+    # Shared move lists are those of get_game_state and are found again
+    shared = SearchCache(get_game_state, play_move)
+    for board in smallboards + bigboards:
+      for color in [1, 2]:
+        shared.game_state(board, color)
+    hits = shared.stats["move_hits"]
+    if all((tuple(get_game_state(*key)[0]), get_game_state(*key)[1]) == shared.game_state(*key) for key in list(shared.move_lists)):
+      if shared.stats["move_hits"] - hits == len(shared.move_lists):
+        check += 1
+    # After a move, the positions with more empty squares than the new root
+    # cannot be reached any more and are dropped, the others are kept
+    root = play_move(bigboards[0], 1, *get_possible_moves(bigboards[0], 1)[0])
+    empties = sum(row.count(0) for row in root)
+    before = [key for key in list(cache) + list(search_cache.move_lists) if sum(row.count(0) for row in key[0]) <= empties]
+    search_cache.new_root(root)
+    after = list(cache) + list(search_cache.move_lists)
+    if before == after and all(sum(row.count(0) for row in key[0]) <= empties for key in after):
+      check += 1
+    print("Caches kept to their memory budget and dropped unreachable positions in {} of {} tests!".format(check, 4))
+
+    # A cache file still gets the opening positions after the game has moved
+    # past them: the agent plays three moves of a game and saves at FINAL
+    path = os.path.join(tempfile.mkdtemp(), "cache.bin")
+    opening = ((0, 0, 0, 0, 0, 0), (0, 0, 0, 0, 0, 0), (0, 0, 2, 1, 0, 0), (0, 0, 1, 2, 0, 0), (0, 0, 0, 0, 0, 0), (0, 0, 0, 0, 0, 0))
+    board = opening
+    lines = ["1,4,0,1,0"]
+    for turn in range(3):
+      lines += ["SCORE 0 0", str(board)]
+      for player in [1, 2]:
+        board = play_move(board, player, *get_possible_moves(board, player)[0])
+    lines.append("FINAL 0 0")
+    for filename in ["agent.py", "agent2.py"]:
+      subprocess.run([sys.executable, filename], input="\n".join(lines) + "\n", capture_output=True, text=True,
+                     cwd=os.path.dirname(os.path.abspath(__file__)), env=dict(os.environ, OTHELLO_CACHE_FILE=path))
+    saved = load_cache(path, evaluation_version(compute_utility))
+    check = int(any(key[0] == opening for key in saved))
+    print("A cache file kept the opening positions of a game in {} of {} tests!".format(check, 1))
+    # agent2.py saved to the same file after agent.py, both sections stay
+    check = int(len(load_sections(path)) == 2 and bool(load_cache(path, evaluation_version(agent2.compute_heuristic, agent2.compute_utility))))
+    print("A cache file shared by agent.py and agent2.py kept the entries of both in {} of {} tests!\n".format(check, 1))
     
 if test_ordering:
 
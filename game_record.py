@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Game records: a compact log of played games, written by
+othello_game.play_game and the GUI, with a replay that rebuilds any position
+of a game and an index for random access to the games of a directory.
+
+A record file holds one record per game, appended one after the other. Each
+record is (integers little-endian):
+    header   magic, format version, board dimension, number of moves n, final
+             dark and light disc counts, byte lengths of the two names
+    names    the dark and the light player's names, UTF-8
+    moves    n bytes, each row * dimension + column (see encode_moves, also
+             used by selfplay.py). Passes are not stored, they are implied
+             whenever the player to move has no legal move
+    times    n float32, the seconds each move took
+
+The header gives the size of the whole record, so the index finds game M by
+reading headers only. Replays keep both colors as bitboards and make every
+move on them incrementally, a tuple board is only built for the positions
+asked for.
+
+Usage: python3 game_record.py [-g <game> [-n <ply>] | --bench] <directory or file>
+"""
+import sys, getopt
+import os
+import struct
+import time
+
+from othello_bitboard import get_geometry, make_move, mobility, to_board, to_bitboards
+from othello_game import OthelloGameManager
+
+MAGIC = b"OTRC"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<4sBBHHHBB")
+SUFFIX = ".otr"
+MAX_DIMENSION = 16  # a move is one byte
+
+
+def encode_moves(moves, dimension):
+    """
+    Return the bytes of a list of (column, row) moves, one per move.
+    """
+    if dimension > MAX_DIMENSION:
+        raise ValueError("Records support boards up to 16x16.")
+    return bytes(j * dimension + i for i, j in moves)
+
+
+def decode_moves(data, dimension):
+    """
+    Return the (column, row) moves of bytes written by encode_moves.
+    """
+    return [(square % dimension, square // dimension) for square in data]
+
+
+class GameRecord(object):
+
+    def __init__(self, dimension, dark_name, light_name, moves=None, times=None, score=(0, 0)):
+        if dimension > MAX_DIMENSION:
+            raise ValueError("Records support boards up to 16x16.")
+        self.dimension = dimension
+        self.names = (dark_name, light_name)
+        self.moves = moves if moves is not None else []  # (column, row) tuples
+        self.times = times if times is not None else []  # seconds per move
+        self.score = score  # final (dark, light) discs
+
+    def add_move(self, i, j, seconds):
+        self.moves.append((i, j))
+        self.times.append(seconds)
+
+    def encode(self):
+        dark_name, light_name = (name.encode("utf-8")[:255] for name in self.names)
+        n = len(self.moves)
+        return b"".join([
+            HEADER.pack(MAGIC, FORMAT_VERSION, self.dimension, n, self.score[0], self.score[1], len(dark_name), len(light_name)),
+            dark_name, light_name,
+            encode_moves(self.moves, self.dimension),
+            struct.pack("<{}f".format(n), *self.times)])
+
+
+def record_size(header):
+    """
+    Return the size in bytes of the record that starts with header, a tuple
+    unpacked with HEADER.
+    """
+    magic, version, dimension, n, dark, light, dark_length, light_length = header
+    if magic != MAGIC or version != FORMAT_VERSION:
+        raise ValueError("Not a version {} game record.".format(FORMAT_VERSION))
+    return HEADER.size + dark_length + light_length + 5 * n
+
+
+def decode_record(data, offset=0):
+    """
+    Return the GameRecord stored at offset in data.
+    """
+    header = HEADER.unpack_from(data, offset)
+    record_size(header)
+    magic, version, dimension, n, dark, light, dark_length, light_length = header
+    pos = offset + HEADER.size
+    dark_name = bytes(data[pos:pos + dark_length]).decode("utf-8")
+    pos += dark_length
+    light_name = bytes(data[pos:pos + light_length]).decode("utf-8")
+    pos += light_length
+    moves = decode_moves(data[pos:pos + n], dimension)
+    times = list(struct.unpack_from("<{}f".format(n), data, pos + n))
+    return GameRecord(dimension, dark_name, light_name, moves, times, (dark, light))
+
+
+def write_record(path, record):
+    """
+    Append record to the record file path.
+    """
+    with open(path, "ab") as f:
+        f.write(record.encode())
+
+
+def read_records(path):
+    """
+    Yield every GameRecord of the record file path.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset < len(data):
+        yield decode_record(data, offset)
+        offset += record_size(HEADER.unpack_from(data, offset))
+
+
+class Replay(object):
+    """
+    The positions of a game. Position n is the board and the player to move
+    after n moves, passes included; position 0 is the start and
+    len(replay) - 1 the end.
+    """
+
+    def __init__(self, record):
+        dimension = record.dimension
+        get_geometry(dimension)
+        dark, light = to_bitboards(OthelloGameManager(dimension).board)
+        player = 1
+        self.dimension = dimension
+        self.states = [(dark, light, player)]
+        for i, j in record.moves:
+            own, opp = (dark, light) if player == 1 else (light, dark)
+            square = j * dimension + i
+            if not mobility(own, opp, dimension) >> square & 1:
+                raise ValueError("Illegal move {},{} in record.".format(i, j))
+            own, opp = make_move(own, opp, square, dimension)
+            dark, light = (own, opp) if player == 1 else (opp, own)
+            # The opponent moves next unless they have to pass
+            if mobility(opp, own, dimension) or not mobility(own, opp, dimension):
+                player = 3 - player
+            self.states.append((dark, light, player))
+
+    def __len__(self):
+        return len(self.states)
+
+    def position(self, n):
+        """
+        Return the (board, player to move) after n moves.
+        """
+        dark, light, player = self.states[n]
+        return to_board(dark, light, self.dimension), player
+
+
+class RecordIndex(object):
+    """
+    Random access to the games of a record file or of every record file in a
+    directory, in file name order. Only the headers are read to build it.
+    """
+
+    def __init__(self, path):
+        if os.path.isdir(path):
+            paths = [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(SUFFIX)]
+        else:
+            paths = [path]
+        self.games = []  # (path, offset, size) per game
+        for file_path in paths:
+            with open(file_path, "rb") as f:
+                offset = 0
+                while True:
+                    header = f.read(HEADER.size)
+                    if len(header) < HEADER.size:
+                        break
+                    size = record_size(HEADER.unpack(header))
+                    self.games.append((file_path, offset, size))
+                    offset += size
+                    f.seek(offset)
+        self.last = (None, None)  # (game, Replay) of the last position asked for
+
+    def __len__(self):
+        return len(self.games)
+
+    def game(self, m):
+        path, offset, size = self.games[m]
+        with open(path, "rb") as f:
+            f.seek(offset)
+            return decode_record(f.read(size))
+
+    def position(self, m, n):
+        """
+        Return the (board, player to move) after n moves of game m.
+        """
+        if self.last[0] != m:
+            self.last = (m, Replay(self.game(m)))
+        return self.last[1].position(n)
+
+
+def benchmark(index):
+    start = time.perf_counter()
+    positions = 0
+    for m in range(len(index)):
+        replay = Replay(index.game(m))
+        for n in range(len(replay)):
+            replay.position(n)
+        positions += len(replay)
+    elapsed = time.perf_counter() - start
+    print("Replayed {} games, {} positions in {:.3f}s ({:.0f} positions/s)".format(
+        len(index), positions, elapsed, positions / max(elapsed, 1e-9)))
+
+
+def main(argv):
+
+    game = None
+    ply = None
+    bench = False
+    usage = 'game_record.py [-g <game> [-n <ply>] | --bench] <directory or file>'
+
+    try:
+        opts, args = getopt.getopt(argv,"hg:n:",["game=","ply=","bench"])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-g", "--game"):
+            game = int(arg)
+        elif opt in ("-n", "--ply"):
+            ply = int(arg)
+        elif opt == "--bench":
+            bench = True
+    if len(args) != 1:
+        print(usage)
+        sys.exit(2)
+
+    index = RecordIndex(args[0])
+    if bench:
+        benchmark(index)
+    elif game is None:
+        for m in range(len(index)):
+            record = index.game(m)
+            print("{:5} {}x{} {} (dark) {}:{} {} (light), {} moves, {:.1f}s".format(
+                m, record.dimension, record.dimension, record.names[0], record.score[0], record.score[1],
+                record.names[1], len(record.moves), sum(record.times)))
+    else:
+        record = index.game(game)
+        n = len(record.moves) if ply is None else ply
+        board, player = index.position(game, n)
+        print("Game {}, after {} moves, {} to move:".format(game, n, "dark" if player == 1 else "light"))
+        for row in board:
+            print(" ".join(".XO"[cell] for cell in row))
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Search for large boards (10x10 up to 16x16 and beyond), used by agent.py and
+agent2.py for every board above search_runtime.LARGE_BOARD.
+
+The tuple boards of agent.py cost a conversion at every node, which grows
+with the square of the dimension. Here the whole search stays on the
+bitboards of othello_bitboard, Python integers of any width, so a node costs
+one move generation and one move whatever the size. The search is a
+negamax alpha-beta with iterative deepening, bounded by a depth limit, a
+time budget or both.
+
+The evaluation tables are built once per dimension from the same squares
+compute_heuristic looks at on any board:
+    corners     the four corner squares, which can never be flipped
+    bad spots   for each corner its X square (diagonal neighbour) and its two
+                C squares (neighbours along the edges); holding them gives the
+                corner away while it is still empty
+    edges       the other edge squares, which can only be flipped along the
+                edge
+Moves are ordered by the same weights: corners first, bad spots last.
+
+Run this module for a benchmark of nodes per second and depth reached in a
+fixed time per board size, against the tuple search of agent.py:
+    python3 large_board.py [-d <dimension>,...] [-s <seconds>] [-n <positions>]
+"""
+import sys, getopt
+import time
+
+from othello_bitboard import get_geometry, make_move, mobility, to_bitboards
+from search_limits import SearchTimeout, count_node, search_deadline, search_stats
+
+INF = float("inf")
+CORNER_WEIGHT = 3  # a stable disc is worth 2 in compute_heuristic, plus the disc
+EDGE_WEIGHT = 1
+BAD_SPOT_WEIGHT = 2  # as in compute_heuristic
+WIN = 10000  # added to the disc difference of a finished game
+
+board_tables = {}  # dimension -> (corners, edges, [(corner, bad spots)], square weights)
+
+
+def get_tables(dimension):
+    """
+    Return the masks of the corners and of the edges, for each corner its
+    mask and the mask of its bad spots, and the move ordering weight of every
+    square.
+    """
+    if dimension not in board_tables:
+        get_geometry(dimension)
+        last = dimension - 1
+
+        def bit(i, j):
+            return 1 << j * dimension + i
+
+        corners = edges = 0
+        neighbours = []
+        for i, j in [(0, 0), (last, 0), (0, last), (last, last)]:
+            i_step = 1 if i == 0 else -1
+            j_step = 1 if j == 0 else -1
+            corners |= bit(i, j)
+            neighbours.append((bit(i, j), bit(i + i_step, j) | bit(i, j + j_step) | bit(i + i_step, j + j_step)))
+        bad_spots = 0
+        for corner, spots in neighbours:
+            bad_spots |= spots
+        for k in range(dimension):
+            edges |= bit(k, 0) | bit(k, last) | bit(0, k) | bit(last, k)
+        edges &= ~(corners | bad_spots)
+        weights = []
+        for square in range(dimension * dimension):
+            weights.append(CORNER_WEIGHT if corners >> square & 1 else
+                           -BAD_SPOT_WEIGHT if bad_spots >> square & 1 else
+                           EDGE_WEIGHT if edges >> square & 1 else 0)
+        board_tables[dimension] = (corners, edges, neighbours, weights)
+    return board_tables[dimension]
+
+
+def popcount(x):
+    return bin(x).count("1")
+
+
+def evaluate_discs(own, opp, own_moves, dimension):
+    """
+    Return the disc difference for the owner of own, like compute_utility.
+    """
+    return popcount(own) - popcount(opp)
+
+
+def evaluate_weights(own, opp, own_moves, dimension):
+    """
+    Return the value of the position for the owner of own, who has the moves
+    own_moves: compute_heuristic's disc difference, corners, bad spots and
+    mobility, with the stable discs approximated by corners and edges.
+    """
+    corners, edges, neighbours, weights = get_tables(dimension)
+    value = popcount(own) - popcount(opp)
+    value += CORNER_WEIGHT * (popcount(own & corners) - popcount(opp & corners))
+    value += EDGE_WEIGHT * (popcount(own & edges) - popcount(opp & edges))
+    occupied = own | opp
+    for corner, spots in neighbours:
+        if not occupied & corner:
+            value -= BAD_SPOT_WEIGHT * (popcount(own & spots) - popcount(opp & spots))
+    return value + popcount(own_moves) - popcount(mobility(opp, own, dimension))
+
+
+def ordered_squares(moves, weights):
+    """
+    Return the squares of a move bitboard, best weight first.
+    """
+    squares = []
+    while moves:
+        low = moves & -moves
+        squares.append(low.bit_length() - 1)
+        moves ^= low
+    squares.sort(key=weights.__getitem__, reverse=True)
+    return squares
+
+
+def negamax(own, opp, depth, alpha, beta, dimension, evaluate):
+    """
+    Return the value for the owner of own, who is to move, of a search depth
+    plies deep (a pass uses up a ply) with the window alpha, beta.
+    """
+    count_node()
+    moves = mobility(own, opp, dimension)
+    if not moves and not mobility(opp, own, dimension):
+        difference = popcount(own) - popcount(opp)
+        return difference + (WIN if difference > 0 else -WIN if difference < 0 else 0)
+    if depth == 0:
+        return evaluate(own, opp, moves, dimension)
+    if not moves:
+        return -negamax(opp, own, depth - 1, -beta, -alpha, dimension, evaluate)
+    best = -INF
+    for square in ordered_squares(moves, get_tables(dimension)[3]):
+        new_own, new_opp = make_move(own, opp, square, dimension)
+        value = -negamax(new_opp, new_own, depth - 1, -beta, -alpha, dimension, evaluate)
+        if value > best:
+            best = value
+            if value > alpha:
+                alpha = value
+                if alpha >= beta:
+                    break
+    return best
+
+
+def search_root(own, opp, depth, dimension, evaluate, first=None):
+    """
+    Return the best square and its value for the owner of own, searching
+    first before the other moves.
+    """
+    squares = ordered_squares(mobility(own, opp, dimension), get_tables(dimension)[3])
+    if first in squares:
+        squares.remove(first)
+        squares.insert(0, first)
+    best_square, alpha = squares[0], -INF
+    for square in squares:
+        new_own, new_opp = make_move(own, opp, square, dimension)
+        value = -negamax(new_opp, new_own, depth - 1, -INF, -alpha, dimension, evaluate)
+        if value > alpha:
+            best_square, alpha = square, value
+    return best_square, alpha
+
+
+def select_move_large(board, color, seconds=None, limit=-1, evaluate=evaluate_weights, report=None):
+    """
+    Return the (column, row) move for color, searching one ply deeper at a
+    time until limit plies (if limit is positive), the end of the game or
+    about seconds (if given) have passed. The best move of the last search
+    is searched first in the next one. report, if given, is called with the
+    depth, move and value after every finished search. Nodes and the depth
+    reached are counted in search_limits.search_stats.
+    """
+    dimension = len(board)
+    dark, light = to_bitboards(board)
+    own, opp = (dark, light) if color == 1 else (light, dark)
+    empties = dimension * dimension - popcount(own | opp)
+    last_depth = min(limit, empties) if limit > 0 else empties
+    best_square = ordered_squares(mobility(own, opp, dimension), get_tables(dimension)[3])[0]
+    search_stats["nodes"] = search_stats["depth"] = 0
+    if seconds is not None:
+        search_deadline[:] = [time.perf_counter() + seconds]
+    try:
+        for depth in range(1, last_depth + 1):
+            best_square, value = search_root(own, opp, depth, dimension, evaluate, best_square)
+            search_stats["depth"] = depth
+            if report is not None:
+                report(depth, (best_square % dimension, best_square // dimension), value)
+    except SearchTimeout:
+        pass
+    finally:
+        del search_deadline[:]
+    return best_square % dimension, best_square // dimension
+
+
+def benchmark(dimensions, seconds, n_positions):
+    import agent
+    from perft import random_positions
+    from search_runtime import select_move_timed
+    print("{} positions per size from random games, {:.1f}s per move".format(n_positions, seconds))
+    for dimension in dimensions:
+        # Spread the positions over the opening and the middle game
+        positions = random_positions(n_positions * 10, dimension)[::10]
+        rows = []
+        for name in ["bitboards", "tuples"]:
+            nodes = elapsed = 0
+            depths = []
+            for board, player, move in positions:
+                start = time.perf_counter()
+                if name == "bitboards":
+                    select_move_large(board, player, seconds)
+                else:
+                    search_stats["nodes"] = 0
+                    select_move_timed(board, player, seconds, lambda depth: agent.select_move_alphabeta(board, player, depth),
+                                      agent.search_cache)
+                nodes += search_stats["nodes"]
+                depths.append(search_stats["depth"])
+                elapsed += time.perf_counter() - start
+            rows.append("{} {:8.0f} nodes/s, depth {:.1f} (min {} max {})".format(
+                name, nodes / elapsed, sum(depths) / len(depths), min(depths), max(depths)))
+        print("{:2}x{:<2}: {}".format(dimension, dimension, "; ".join(rows)))
+
+
+def main(argv):
+
+    dimensions = [8, 10, 12, 14, 16]
+    seconds = 1.0
+    n_positions = 5
+    usage = 'large_board.py [-d <dimension>,... -s <seconds> -n <positions>]'
+
+    try:
+        opts, args = getopt.getopt(argv,"hd:s:n:",["dimensions=","seconds=","positions="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-d", "--dimensions"):
+            dimensions = [int(dimension) for dimension in arg.split(",")]
+        elif opt in ("-s", "--seconds"):
+            seconds = float(arg)
+        elif opt in ("-n", "--positions"):
+            n_positions = int(arg)
+
+    benchmark(dimensions, seconds, n_positions)
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+A Monte Carlo Tree Search (UCT) AI for Othello. It speaks the same protocol
+as agent.py, but needs no evaluation function: every iteration walks down
+the tree by the UCT rule, adds the children of the node it reaches and
+plays one random game to the end from there.
+
+The tree lives in a few parallel lists indexed by node number instead of
+one object per node, and child boards are only computed when a child is
+first visited. Playouts run on the bitboards of othello_bitboard and pick
+a corner whenever one is available, otherwise a random move. After each
+move the subtree of the position the opponent left us is kept for the next
+search.
+
+The depth limit does not apply. The time control sent by the manager
+bounds the search, unless the configuration line has a playouts=<n> key
+for a fixed number of playouts per move. Without either key it plays
+DEFAULT_PLAYOUTS per move: the manager's timeout is no clock to plan with.
+A workers=<n> key spreads the search over n processes, either as
+independent trees whose root visits are added up (parallel=root, the
+default) or as batches of leaves whose playouts run in a process pool
+(parallel=leaf).
+
+Run with --bench to measure playouts per second, with --scaling to compare
+1 to <workers> processes in both parallel modes:
+    python3 mcts_agent.py --bench|--scaling [-d <dimension>] [-s <seconds>] [-w <workers>]
+"""
+
+import sys, getopt
+import math
+import multiprocessing
+import random
+import time
+
+from othello_shared import PASS, get_game_state, get_possible_moves, play_move
+from othello_bitboard import captured_lines, mobility, to_bitboards
+from time_manager import allocate, parse_time_control
+
+EXPLORATION = 1.4  # UCT exploration constant, results are in [0, 1]
+MAX_NODES = 500000  # start a fresh tree rather than reuse one larger than this
+LEAF_PLAYOUTS = 8  # playouts per leaf sent to a worker with leaf parallelization
+DEFAULT_PLAYOUTS = 2000  # per move when the configuration line has neither time= nor playouts=
+
+search_stats = {"playouts": 0, "seconds": 0.0}  # totals over the game
+worker_pool = []  # (size, multiprocessing.Pool) of a parallel search, once started
+
+
+def eprint(*args, **kwargs):  # use this for debugging, to print to sterr
+    print(*args, file=sys.stderr, **kwargs)
+
+
+class Tree(object):
+    """
+    A search tree in parallel lists with one entry per node. The children of
+    a node are added together, so they are the nodes first_child[n] to
+    first_child[n] + n_children[n] - 1. first_child is -1 until a node is
+    expanded; an expanded node without children is the end of the game.
+    wins counts the playouts won by the player who moved into the node.
+    """
+
+    __slots__ = ("board", "player", "parent", "move", "first_child", "n_children", "visits", "wins", "root")
+
+    def __init__(self, board, player):
+        self.board = []
+        self.player = []
+        self.parent = []
+        self.move = []
+        self.first_child = []
+        self.n_children = []
+        self.visits = []
+        self.wins = []
+        self.add(board, player, -1, None)
+        self.root = 0
+
+    def __len__(self):
+        return len(self.board)
+
+    def add(self, board, player, parent, move):
+        self.board.append(board)
+        self.player.append(player)
+        self.parent.append(parent)
+        self.move.append(move)
+        self.first_child.append(-1)
+        self.n_children.append(0)
+        self.visits.append(0)
+        self.wins.append(0.0)
+
+    def get_board(self, node):
+        """
+        Return the board of node, playing the move from its parent on first
+        use. A child with move None is a pass and shares its parent's board.
+        """
+        board = self.board[node]
+        if board is None:
+            board = self.get_board(self.parent[node])
+            move = self.move[node]
+            if move is not None:
+                board = play_move(board, self.player[self.parent[node]], move[0], move[1])
+            self.board[node] = board
+        return board
+
+    def expand(self, node):
+        player = self.player[node]
+        opponent = 1 if player == 2 else 2
+        moves, state = get_game_state(self.get_board(node), player)
+        if state == PASS:
+            moves = [None]
+        self.first_child[node] = len(self.board)
+        self.n_children[node] = len(moves)
+        for move in moves:
+            self.add(None, opponent, node, move)
+
+    def select_child(self, node):
+        """
+        Return the child of node with the highest UCT value, trying every
+        child once first.
+        """
+        first = self.first_child[node]
+        visits = self.visits
+        wins = self.wins
+        log_visits = math.log(visits[node] or 1)
+        best, best_value = first, -1.0
+        for child in range(first, first + self.n_children[node]):
+            n = visits[child]
+            if n == 0:
+                return child
+            value = wins[child] / n + EXPLORATION * math.sqrt(log_visits / n)
+            if value > best_value:
+                best, best_value = child, value
+        return best
+
+    def select_leaf(self):
+        """
+        Walk down from the root by the UCT rule to a node that was never
+        visited or ends the game, expanding the nodes on the way.
+        """
+        node = self.root
+        while True:
+            if self.first_child[node] == -1:
+                if self.visits[node] == 0:
+                    return node
+                self.expand(node)
+            if self.n_children[node] == 0:
+                return node
+            node = self.select_child(node)
+
+    def backpropagate(self, node, playouts, dark_wins, light_wins):
+        """
+        Add the results of playouts from node to it and all its ancestors,
+        a draw counting half a win for both sides.
+        """
+        visits = self.visits
+        wins = self.wins
+        parent = self.parent
+        draws = (playouts - dark_wins - light_wins) * 0.5
+        while node != -1:
+            visits[node] += playouts
+            up = parent[node]
+            if up != -1:
+                wins[node] += (dark_wins if self.player[up] == 1 else light_wins) + draws
+            node = up
+
+    def add_visits(self, node, count):
+        """
+        Add visits without wins from node up to the root. A leaf waiting for
+        its playouts counts as lost meanwhile (a "virtual loss"), so the
+        next selections spread over other leaves.
+        """
+        while node != -1:
+            self.visits[node] += count
+            node = self.parent[node]
+
+    def root_visits(self):
+        """
+        Return a {move: visits} dict for the children of the root.
+        """
+        first = self.first_child[self.root]
+        return {self.move[child]: self.visits[child] for child in range(first, first + self.n_children[self.root])}
+
+    def advance(self, move, board, player):
+        """
+        Make the node for board with player to move the new root if it was
+        reached from the root by move and one reply, and return whether it
+        was found.
+        """
+        root = self.root
+        for child in range(self.first_child[root], self.first_child[root] + self.n_children[root]):
+            if self.move[child] != move:
+                continue
+            first = self.first_child[child]
+            for grandchild in range(first, first + self.n_children[child]):
+                if self.player[grandchild] == player and self.get_board(grandchild) == board:
+                    self.root = grandchild
+                    self.parent[grandchild] = -1
+                    return True
+        return False
+
+
+def random_square(moves, rng):
+    """
+    Return the index of a random set bit of moves.
+    """
+    for k in range(rng.randrange(bin(moves).count("1"))):
+        moves &= moves - 1
+    return (moves & -moves).bit_length() - 1
+
+
+def playout(board, player, rng):
+    """
+    Play random moves from board with player to move until the game ends,
+    taking a corner whenever one is legal. Returns the winner, 0 for a draw.
+    """
+    dimension = len(board)
+    last = dimension - 1
+    corners = 1 | 1 << last | 1 << last * dimension | 1 << last * dimension + last
+    dark, light = to_bitboards(board)
+    own, opp = (dark, light) if player == 1 else (light, dark)
+    passed = False
+    while True:
+        moves = mobility(own, opp, dimension)
+        if not moves:
+            if passed:
+                break
+            passed = True
+        else:
+            passed = False
+            if moves & corners:
+                moves &= corners
+            square = random_square(moves, rng)
+            flipped = 1 << square
+            for line in captured_lines(own, opp, square, dimension):
+                flipped |= line
+            own |= flipped
+            opp &= ~flipped
+        own, opp = opp, own
+        player = 1 if player == 2 else 2
+    own_count = bin(own).count("1")
+    opp_count = bin(opp).count("1")
+    if own_count == opp_count:
+        return 0
+    return player if own_count > opp_count else (1 if player == 2 else 2)
+
+
+def search(tree, rng, seconds=None, playouts=None):
+    """
+    Run MCTS iterations from the root of tree until seconds have passed or
+    playouts iterations are done. Returns the number of iterations.
+    """
+    deadline = time.perf_counter() + (seconds or 0)
+    if tree.first_child[tree.root] == -1:
+        tree.expand(tree.root)
+    iterations = 0
+    while True:
+        if playouts is not None:
+            if iterations >= playouts:
+                break
+        elif not iterations & 15 and time.perf_counter() > deadline:
+            break
+        node = tree.select_leaf()
+        winner = playout(tree.get_board(node), tree.player[node], rng)
+        tree.backpropagate(node, 1, winner == 1, winner == 2)
+        iterations += 1
+    return iterations
+
+
+def worker_search(task):
+    """
+    Root parallelization, run in a pool process: search a tree of its own
+    for the position and return the visits of each root move.
+    """
+    board, player, seconds, playouts, seed = task
+    tree = Tree(board, player)
+    search(tree, random.Random(seed), seconds, playouts)
+    return tree.root_visits()
+
+
+def worker_playouts(task):
+    """
+    Leaf parallelization, run in a pool process: play count playouts from
+    one leaf and return (playouts, dark wins, light wins).
+    """
+    board, player, count, seed = task
+    rng = random.Random(seed)
+    dark_wins = light_wins = 0
+    for k in range(count):
+        winner = playout(board, player, rng)
+        dark_wins += winner == 1
+        light_wins += winner == 2
+    return count, dark_wins, light_wins
+
+
+def get_pool(size):
+    """
+    Return a process pool with size workers, started on first use and kept
+    for later moves and games.
+    """
+    if worker_pool and worker_pool[0][0] != size:
+        worker_pool.pop()[1].terminate()
+    if not worker_pool:
+        worker_pool.append((size, multiprocessing.Pool(size)))
+    return worker_pool[0][1]
+
+
+def search_root_parallel(tree, workers, rng, seconds=None, playouts=None):
+    """
+    Search tree here while workers - 1 pool processes search independent
+    trees of the same position. Returns the root visits of all trees added
+    up per move and the number of playouts.
+    """
+    board = tree.get_board(tree.root)
+    share = None if playouts is None else playouts // workers
+    tasks = [(board, tree.player[tree.root], seconds, share, rng.getrandbits(64)) for k in range(workers - 1)]
+    pending = get_pool(workers - 1).map_async(worker_search, tasks)
+    iterations = search(tree, rng, seconds, None if playouts is None else playouts - share * (workers - 1))
+    visits = tree.root_visits()
+    for result in pending.get():
+        for move, n in result.items():
+            visits[move] += n
+        iterations += sum(result.values())
+    return visits, iterations
+
+
+def search_leaf_parallel(tree, workers, rng, seconds=None, playouts=None):
+    """
+    Grow one tree, sending a batch of one leaf per worker to the pool and
+    playing LEAF_PLAYOUTS playouts from each. Returns the number of
+    playouts.
+    """
+    deadline = time.perf_counter() + (seconds or 0)
+    pool = get_pool(workers)
+    if tree.first_child[tree.root] == -1:
+        tree.expand(tree.root)
+    iterations = 0
+    while (iterations < playouts) if playouts is not None else (time.perf_counter() < deadline):
+        leaves = []
+        for k in range(workers):
+            node = tree.select_leaf()
+            tree.add_visits(node, LEAF_PLAYOUTS)
+            leaves.append(node)
+        tasks = [(tree.get_board(node), tree.player[node], LEAF_PLAYOUTS, rng.getrandbits(64)) for node in leaves]
+        for node, (count, dark_wins, light_wins) in zip(leaves, pool.map(worker_playouts, tasks)):
+            tree.add_visits(node, -LEAF_PLAYOUTS)
+            tree.backpropagate(node, count, dark_wins, light_wins)
+            iterations += count
+    return iterations
+
+
+def select_move_mcts(tree, seconds=None, playouts=None, rng=random, workers=1, parallel="root"):
+    """
+    Search from the root of tree and return the most visited move. With
+    more than one worker the search is spread over a process pool, by
+    independent trees (parallel="root") or by batches of leaves
+    (parallel="leaf"). Without seconds or playouts it plays
+    DEFAULT_PLAYOUTS.
+    """
+    if seconds is None and playouts is None:
+        playouts = DEFAULT_PLAYOUTS
+    start = time.perf_counter()
+    if workers > 1 and parallel == "leaf":
+        iterations = search_leaf_parallel(tree, workers, rng, seconds, playouts)
+        visits = tree.root_visits()
+    elif workers > 1:
+        visits, iterations = search_root_parallel(tree, workers, rng, seconds, playouts)
+    else:
+        iterations = search(tree, rng, seconds, playouts)
+        visits = tree.root_visits()
+    elapsed = time.perf_counter() - start
+    search_stats["playouts"] += iterations
+    search_stats["seconds"] += elapsed
+    move = max(visits, key=visits.get)
+    eprint("{} playouts in {:.2f}s ({:.0f} playouts/s), tree {} nodes, best move visited {} times".format(
+        iterations, elapsed, iterations / max(elapsed, 1e-9), len(tree), visits[move]))
+    return move
+
+
+####################################################
+def run_ai():
+    """
+    This function establishes communication with the game manager.
+    It first introduces itself and receives its color.
+    Then it repeatedly receives the current score and current board state until the game is over.
+    """
+    print("MCTS AI")  # First line is the name of this AI
+    while True:
+        play_one_game(input().split(","))
+
+        # Accept RESET from a pool like agent.py (see agent_pool.py)
+        try:
+            command = input()
+        except EOFError:
+            break
+        if command.strip() != "RESET":
+            break
+        search_stats["playouts"] = 0
+        search_stats["seconds"] = 0.0
+        print("MCTS AI")
+    for size, pool in worker_pool:
+        pool.terminate()
+
+
+def play_one_game(arguments):
+    """
+    Play a single game with the configuration line sent by the manager,
+    returning once the game is over.
+    """
+    color = int(arguments[0])  # Player color: 1 for dark (goes first), 2 for light.
+    # The depth limit, minimax, caching and ordering flags have no impact on MCTS
+    options = dict(argument.split("=", 1) for argument in arguments[5:])
+    playouts = int(options["playouts"]) if "playouts" in options else None
+    workers = int(options.get("workers", 1))
+    parallel = options.get("parallel", "root")
+    if workers > 1:
+        eprint("MCTS with {} workers, {} parallelization".format(workers, parallel))
+    if "time" in options:
+        per_move, total, increment = parse_time_control(options["time"])
+    elif playouts is None:
+        playouts = DEFAULT_PLAYOUTS
+    tree = None
+    last_move = None
+
+    while True:  # This is the main loop
+        # "SCORE <dark> <light> [<seconds left>]" or "FINAL <dark> <light>"
+        fields = input().strip().split()
+        if fields[0] == "FINAL":  # Game is over.
+            if search_stats["seconds"]:
+                eprint("MCTS averaged {:.0f} playouts/s".format(search_stats["playouts"] / search_stats["seconds"]))
+            break
+        board = eval(input())
+
+        if tree is None or len(tree) > MAX_NODES or not tree.advance(last_move, board, color):
+            tree = Tree(board, color)
+        moves = get_possible_moves(board, color)
+        seconds = None
+        if playouts is None:
+            seconds = allocate(float(fields[3]), per_move, increment, sum(row.count(0) for row in board),
+                               len(board) * len(board), len(moves))
+        if len(moves) == 1 or seconds == 0:
+            movei, movej = moves[0]
+        else:
+            movei, movej = select_move_mcts(tree, seconds, playouts, random, workers, parallel)
+        last_move = (movei, movej)
+        print("{} {}".format(movei, movej))
+
+
+def benchmark(dimension, seconds, workers=1, parallel="root"):
+    """
+    Return the playouts per second of a search from the starting position.
+    """
+    from othello_game import OthelloGameManager
+    tree = Tree(OthelloGameManager(dimension).board, 1)
+    if workers > 1:
+        get_pool(workers - 1 if parallel == "root" else workers) # not part of the timing
+    rng = random.Random(0)
+    start = time.perf_counter()
+    if workers > 1 and parallel == "leaf":
+        iterations = search_leaf_parallel(tree, workers, rng, seconds)
+    elif workers > 1:
+        iterations = search_root_parallel(tree, workers, rng, seconds)[1]
+    else:
+        iterations = search(tree, rng, seconds)
+    return iterations / (time.perf_counter() - start)
+
+
+def main(argv):
+
+    dimension = 8
+    seconds = 5.0
+    workers = multiprocessing.cpu_count()
+    scaling = False
+    usage = 'mcts_agent.py --bench|--scaling [-d <dimension> -s <seconds> -w <workers>]'
+
+    try:
+        opts, args = getopt.getopt(argv,"hd:s:w:",["bench","scaling","dimension=","seconds=","workers="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt == "--scaling":
+            scaling = True
+        elif opt in ("-d", "--dimension"):
+            dimension = int(arg)
+        elif opt in ("-s", "--seconds"):
+            seconds = float(arg)
+        elif opt in ("-w", "--workers"):
+            workers = int(arg)
+
+    if not scaling:
+        print("{}x{}: {:.0f} playouts/s".format(dimension, dimension, benchmark(dimension, seconds)))
+        return
+    print("{}x{}, {} cores, {:g}s per measurement".format(dimension, dimension, multiprocessing.cpu_count(), seconds))
+    base = benchmark(dimension, seconds)
+    for parallel in ("root", "leaf"):
+        print("{} parallelization".format(parallel))
+        for n in range(1, workers + 1):
+            rate = base if n == 1 else benchmark(dimension, seconds, n, parallel)
+            print("{:3} workers {:8.0f} playouts/s {:5.2f}x |{}".format(n, rate, rate / base, "#" * int(round(20 * rate / base))))
+    for size, pool in worker_pool:
+        pool.terminate()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        main(sys.argv[1:])
+    else:
+        run_ai()
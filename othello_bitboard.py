@@ -0,0 +1,201 @@
+"""
+Bitboard move generation for Othello, a backend for othello_shared.
+
+Each color is a Python integer with bit j*dimension+i set for a stone on
+column i and row j, so any board size fits. Legal moves for all squares are
+found at once by shifting the player's stones across runs of opponent
+stones in each of the eight directions. Boards are converted from and back
+to tuples one row at a time through lookup tables that fill up as rows are
+seen, up to MAX_ROWS rows per board size.
+"""
+from othello_shared import PLAYING, PASS, GAME_OVER
+
+DIRECTIONS = [(0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1)]
+
+geometry = {}  # dimension -> (full mask, [(shift, mask)] per direction)
+row_to_bits = {}  # dimension -> {row tuple: (dark bits, light bits)}
+bits_to_row = {}  # dimension -> {(dark bits, light bits): row tuple}
+# Every row of an 8x8 board fits. Larger boards have up to 3**dimension
+# rows, so once a table is full further rows are converted without it
+MAX_ROWS = 3 ** 8
+
+
+def get_geometry(dimension):
+    """
+    Return the mask of all squares and, for every direction, the bit shift of
+    one step and the mask of squares a step may land on without wrapping
+    around an edge.
+    """
+    if dimension not in geometry:
+        full = (1 << dimension * dimension) - 1
+        first_column = sum(1 << j * dimension for j in range(dimension))
+        last_column = first_column << dimension - 1
+        steps = []
+        for xdir, ydir in DIRECTIONS:
+            mask = full
+            if xdir == 1:
+                mask &= ~first_column
+            elif xdir == -1:
+                mask &= ~last_column
+            steps.append((ydir * dimension + xdir, mask))
+        geometry[dimension] = (full, steps)
+        row_to_bits[dimension] = {}
+        bits_to_row[dimension] = {}
+    return geometry[dimension]
+
+
+def shift(x, step, mask):
+    return (x << step) & mask if step > 0 else (x >> -step) & mask
+
+
+def to_bitboards(board):
+    """
+    Return the (dark, light) bitboards of a tuple board.
+    """
+    dimension = len(board)
+    get_geometry(dimension)
+    table = row_to_bits[dimension]
+    dark = light = 0
+    offset = 0
+    for row in board:
+        bits = table.get(row)
+        if bits is None:
+            bits = (sum(1 << k for k, cell in enumerate(row) if cell == 1),
+                    sum(1 << k for k, cell in enumerate(row) if cell == 2))
+            if len(table) < MAX_ROWS:
+                table[row] = bits
+        dark |= bits[0] << offset
+        light |= bits[1] << offset
+        offset += dimension
+    return dark, light
+
+
+def to_board(dark, light, dimension):
+    """
+    Return the tuple board of a pair of bitboards.
+    """
+    table = bits_to_row[dimension]
+    row_mask = (1 << dimension) - 1
+    rows = []
+    for offset in range(0, dimension * dimension, dimension):
+        bits = ((dark >> offset) & row_mask, (light >> offset) & row_mask)
+        row = table.get(bits)
+        if row is None:
+            row = tuple(1 if bits[0] >> k & 1 else 2 if bits[1] >> k & 1 else 0 for k in range(dimension))
+            if len(table) < MAX_ROWS:
+                table[bits] = row
+        rows.append(row)
+    return tuple(rows)
+
+
+def mobility(own, opp, dimension):
+    """
+    Return the bitboard of the squares where the owner of own can capture.
+    """
+    full, steps = get_geometry(dimension)
+    moves = 0
+    # shift() inlined, this is the hottest loop of every bitboard user
+    for step, mask in steps:
+        targets = opp & mask
+        if step > 0:
+            x = (own << step) & targets
+            for k in range(dimension - 3):
+                if not x:
+                    break
+                x |= (x << step) & targets
+            moves |= (x << step) & mask
+        else:
+            x = (own >> -step) & targets
+            for k in range(dimension - 3):
+                if not x:
+                    break
+                x |= (x >> -step) & targets
+            moves |= (x >> -step) & mask
+    return moves & full & ~(own | opp)
+
+
+def move_list(moves, dimension):
+    """
+    Return the (column, row) tuples of a move bitboard, column by column like
+    the tuple backend.
+    """
+    result = []
+    while moves:
+        low = moves & -moves
+        square = low.bit_length() - 1
+        result.append((square % dimension, square // dimension))
+        moves ^= low
+    result.sort()
+    return result
+
+
+def captured_lines(own, opp, square, dimension):
+    """
+    Return the bitboards of the stones captured by playing square, one per
+    direction that captures anything.
+    """
+    lines = []
+    for step, mask in get_geometry(dimension)[1]:
+        line = 0
+        x = shift(1 << square, step, mask)
+        while x & opp:
+            line |= x
+            x = shift(x, step, mask)
+        if line and x & own:
+            lines.append(line)
+    return lines
+
+
+def find_lines(board, i, j, player):
+    dimension = len(board)
+    dark, light = to_bitboards(board)
+    own, opp = (dark, light) if player == 1 else (light, dark)
+    lines = []
+    for step, mask in get_geometry(dimension)[1]:
+        line = []
+        x = shift(1 << j * dimension + i, step, mask)
+        while x & opp:
+            square = x.bit_length() - 1
+            line.append((square % dimension, square // dimension))
+            x = shift(x, step, mask)
+        if line and x & own:
+            lines.append(line)
+    return lines
+
+
+def get_possible_moves(board, player):
+    dark, light = to_bitboards(board)
+    own, opp = (dark, light) if player == 1 else (light, dark)
+    return move_list(mobility(own, opp, len(board)), len(board))
+
+
+def get_game_state(board, player):
+    dimension = len(board)
+    dark, light = to_bitboards(board)
+    own, opp = (dark, light) if player == 1 else (light, dark)
+    moves = mobility(own, opp, dimension)
+    if moves:
+        return move_list(moves, dimension), PLAYING
+    if mobility(opp, own, dimension):
+        return [], PASS
+    return [], GAME_OVER
+
+
+def make_move(own, opp, square, dimension):
+    """
+    Return the (own, opp) bitboards after the owner of own plays square.
+    """
+    flipped = 0
+    for line in captured_lines(own, opp, square, dimension):
+        flipped |= line
+    return own | flipped | 1 << square, opp & ~flipped
+
+
+def play_move(board, player, i, j):
+    dimension = len(board)
+    dark, light = to_bitboards(board)
+    own, opp = (dark, light) if player == 1 else (light, dark)
+    own, opp = make_move(own, opp, j * dimension + i, dimension)
+    if player == 1:
+        return to_board(own, opp, dimension)
+    return to_board(opp, own, dimension)
@@ -8,8 +8,10 @@ Thanks to original author Daniel Bauer, Columbia University
 """
 import sys
 import subprocess
+import time
 from threading import Timer
-from othello_shared import find_lines, get_possible_moves, play_move, get_score
+from othello_shared import find_lines, get_possible_moves, get_game_state, play_move, get_score, PASS, GAME_OVER
+from time_manager import parse_time_control
 
 class InvalidMoveError(RuntimeError):
     pass
@@ -19,6 +21,57 @@ class AiTimeoutError(RuntimeError):
     pass
 
 
+class TimeControl(object):
+    """
+    The clock of one player. Either a fixed budget per move, written
+    "move:<seconds>", or a total time for the game plus an increment added
+    after every move, written "game:<seconds>+<increment>".
+    """
+
+    def __init__(self, per_move = None, total = None, increment = 0):
+        self.per_move = per_move
+        self.total = total
+        self.increment = increment
+        self.remaining = total
+
+    @classmethod
+    def from_string(cls, spec):
+        per_move, total, increment = parse_time_control(spec)
+        return cls(per_move, total, increment)
+
+    def __str__(self):
+        if self.per_move is not None:
+            return "move:{:g}".format(self.per_move)
+        return "game:{:g}+{:g}".format(self.total, self.increment)
+
+    def budget(self):
+        """
+        Seconds the player may use for the next move before losing on time.
+        """
+        if self.per_move is not None:
+            return self.per_move
+        return max(self.remaining, 0)
+
+    def charge(self, elapsed):
+        if self.per_move is None:
+            self.remaining += self.increment - elapsed
+
+
+def parse_info(line):
+    """
+    Return the fields of an "INFO <key> <value> ..." line sent by an AI as a
+    dict of strings. A pv key takes the rest of the line, a list of moves.
+    """
+    fields = line.split()[1:]
+    info = {}
+    for k in range(0, len(fields) - 1, 2):
+        if fields[k] == "pv":
+            info["pv"] = fields[k + 1:]
+            break
+        info[fields[k]] = fields[k + 1]
+    return info
+
+
 class Player(object):
     def __init__(self, color, name="Human"):
         self.name = name
@@ -30,8 +83,9 @@ class Player(object):
 class AiPlayerInterface(Player):
 
     TIMEOUT = 10 
+    FINAL_TIMEOUT = 5
 
-    def __init__(self, filename, color, limit, minimax = False, caching = False, ordering = False):
+    def __init__(self, filename, color, limit, minimax = False, caching = False, ordering = False, process = None, name = None, time_control = None, info = False, options = None):
         
         #convert params to numbers 
         m = 0 
@@ -42,11 +96,30 @@ class AiPlayerInterface(Player):
         if ordering == True: o = 1
 
         self.color = color
-        self.process = subprocess.Popen(['python3',filename], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
-        name = self.process.stdout.readline().decode("ASCII").strip()
+        self.pool = None # set by AgentPool.acquire for a warm, reusable process
+        if process is None:
+            process = subprocess.Popen(['python3',filename], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self.process = process
+        if name is None:
+            name = self.process.stdout.readline().decode("ASCII").strip()
         print("AI introduced itself as: {}".format(name))
         self.name = name
-        self.process.stdin.write((str(color) + "," + str(limit) + "," + str(m) + "," + str(c) + "," + str(o) + "\n").encode("ASCII"))
+        # Without a time control the AI searches to its depth limit and only
+        # the default timeout applies, so it is not told about the clock
+        self.clock = TimeControl.from_string(time_control or "move:{}".format(AiPlayerInterface.TIMEOUT))
+        self.timed = time_control is not None
+        # With info=1 the AI may send INFO lines while it searches, passed to on_info
+        self.on_info = None
+        # Options after the first five fields are key=value pairs, options
+        # adds its own (e.g. {"workers": 4} for mcts_agent.py)
+        fields = [color, limit, m, c, o]
+        if time_control is not None:
+            fields.append("time=" + str(self.clock))
+        if info:
+            fields.append("info=1")
+        if options:
+            fields.extend("{}={}".format(key, value) for key, value in options.items())
+        self.process.stdin.write((",".join(str(field) for field in fields) + "\n").encode("ASCII"))
         self.process.stdin.flush()
 
     def timeout(self): 
@@ -57,28 +130,49 @@ class AiPlayerInterface(Player):
     def get_move(self, manager):
         white_score, dark_score = get_score(manager.board)
         print((white_score, dark_score))
-        self.process.stdin.write("SCORE {} {}\n".format(white_score, dark_score).encode("ASCII"))
+        # With a time control a last field gives the seconds the AI has left
+        # for this move, without one the line keeps its original three fields
+        budget = self.clock.budget()
+        score_line = "SCORE {} {}".format(white_score, dark_score)
+        if self.timed:
+            score_line += " {:.3f}".format(budget)
+        self.process.stdin.write((score_line + "\n").encode("ASCII"))
         self.process.stdin.flush()
         self.process.stdin.write("{}\n".format(str(manager.board)).encode("ASCII"))
         self.process.stdin.flush()
 
-        timer = Timer(AiPlayerInterface.TIMEOUT, lambda: self.timeout())
+        timer = Timer(budget, lambda: self.timeout())
         self.timed_out = False
+        start = time.perf_counter()
         timer.start()
 
-        # Wait for the AI call
+        # Wait for the AI call, "INFO <key> <value> ..." lines come before the move
         move_s = self.process.stdout.readline().decode("ASCII")
+        while move_s.startswith("INFO "):
+            if self.on_info is not None:
+                self.on_info(parse_info(move_s))
+            move_s = self.process.stdout.readline().decode("ASCII")
         if self.timed_out:  
             raise AiTimeoutError
         timer.cancel()
+        self.clock.charge(time.perf_counter() - start)
         i_s, j_s = move_s.strip().split()
         i = int(i_s)
         j = int(j_s)
         return i,j 
     
     def kill(self,manager):
+        if self.pool is not None:
+            self.pool.release(self, manager)
+            return
         white_score, dark_score = get_score(manager.board)
-        self.process.stdin.write("FINAL {} {}\n".format(white_score, dark_score).encode("ASCII"))
+        try:
+            self.process.stdin.write("FINAL {} {}\n".format(white_score, dark_score).encode("ASCII"))
+            self.process.stdin.close()
+            # Give the AI a moment to save state (e.g. a persistent cache) and exit
+            self.process.wait(AiPlayerInterface.FINAL_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
         self.process.kill() 
 
 
@@ -126,30 +220,50 @@ class OthelloGameManager(object):
     def get_possible_moves(self):
         return get_possible_moves(self.board, self.current_player)
 
-def play_game(game, player1, player2):
+    def get_game_state(self):
+        return get_game_state(self.board, self.current_player)
+
+    def pass_turn(self):
+        self.current_player = 1 if self.current_player == 2 else 2
+
+def play_game(game, player1, player2, record = None):
+    """
+    Play a game to the end. If record is a path, the game is appended to that
+    record file, see game_record.py.
+    """
+    from game_record import GameRecord, write_record
 
     players = [None, player1, player2]
+    game_record = GameRecord(game.dimension, player1.name, player2.name)
 
     while True: 
         player_obj = players[game.current_player]
-        possible_moves = game.get_possible_moves() 
-        if not possible_moves: 
+        color = "dark" if game.current_player == 1 else "light"
+        possible_moves, state = game.get_game_state() 
+        if state == GAME_OVER: 
             p1score, p2score = get_score(game.board)
             print("FINAL: {} (dark) {}:{} {} (light)".format(player1.name, p1score, p2score, player2.name))
             player1.kill(game)
             player2.kill(game)
             break 
+        elif state == PASS: 
+            print("{} ({}) has no moves and passes".format(player_obj.name, color))
+            game.pass_turn()
         else: 
-            color = "dark" if game.current_player == 1 else "light"
             try: 
+                start = time.perf_counter()
                 i, j = player_obj.get_move(game)
                 print("{} ({}) plays {},{}".format(player_obj.name, color, i,j))
                 game.play(i,j)
+                game_record.add_move(i, j, time.perf_counter() - start)
             except AiTimeoutError:
+                p1score, p2score = get_score(game.board)
                 print("{} ({}) timed out!".format(player_obj.name, color))
-                print("FINAL: {} (dark) {}:{} {} (light)".format(player_obj.name, p1score, p2score, player2.name))
+                print("FINAL: {} (dark) {}:{} {} (light)".format(player1.name, p1score, p2score, player2.name))
                 player1.kill(game)
                 player2.kill(game)
                 break
 
-
+    if record is not None:
+        game_record.score = (p1score, p2score)
+        write_record(record, game_record)
@@ -6,19 +6,30 @@ This module contains a simple graphical user interface for Othello.
 Thanks to original author Daniel Bauer, Columbia University
 """
 import sys, getopt
+import queue
+import random
+import threading
+import time
 
 from tkinter import *
 from tkinter import scrolledtext
 
 from othello_game import OthelloGameManager, AiPlayerInterface, Player, InvalidMoveError, AiTimeoutError
-from othello_shared import get_possible_moves, get_score
+from game_record import GameRecord, write_record
+from othello_shared import get_score, PASS, GAME_OVER
 
 class OthelloGui(object):
 
-    def __init__(self, game_manager, player1, player2):
+    POLL_INTERVAL = 50  # ms between checks for the move of a thinking AI
+
+    def __init__(self, game_manager, player1, player2, analysis = False, record = None):
 
         self.game = game_manager
         self.players = [None, player1, player2]
+        self.analysis = analysis  # Show the search of the AIs, see handle_info
+        self.record = record  # Record file the game is appended to, see game_record.py
+        self.game_record = GameRecord(self.game.dimension, player1.name, player2.name)
+        self.move_start = time.perf_counter()
         self.height = self.game.dimension
         self.width = self.game.dimension 
         
@@ -33,11 +44,18 @@ class OthelloGui(object):
         self.canvas = Canvas(root,height = self.cell_size * self.height + self.offset,width = self.cell_size * self.width + self.offset)
         self.move_label = Label(root)
         self.score_label = Label(root)
+        self.analysis_label = Label(root)
         self.text = scrolledtext.ScrolledText(root, width=70, height=10)
         self.move_label.pack(side="top")
         self.score_label.pack(side="top")
+        if analysis:
+            self.analysis_label.pack(side="top")
         self.canvas.pack()
         self.text.pack()
+        self.shown = None  # The board the disc items show
+        self.scored = []  # The score items showing text
+        self.results = queue.Queue()  # ("info" | "move" | "timeout" | "error", value) from think
+        self.draw_grid()
         self.draw_board()
 
     def get_position(self,x,y):
@@ -52,8 +70,10 @@ class OthelloGui(object):
             player = "Dark" if self.game.current_player == 1 else "Light"
             self.log("{}: {},{}".format(player, i,j))
             self.game.play(i, j)
+            self.record_move(i, j)
+            state = self.skip_passes()
             self.draw_board()
-            if not get_possible_moves(self.game.board, self.game.current_player):
+            if state == GAME_OVER:
                 self.shutdown("Game Over")
             elif isinstance(self.players[self.game.current_player], AiPlayerInterface):
                 self.root.unbind("<Button-1>")
@@ -61,31 +81,124 @@ class OthelloGui(object):
         except InvalidMoveError:
             self.log("Invalid move. {},{}".format(i,j))
 
+    def skip_passes(self):
+        """
+        Let the player to move pass if they have no legal move. Returns the
+        state reported by the game manager, so GAME_OVER means nobody can move.
+        """
+        moves, state = self.game.get_game_state()
+        if state == PASS:
+            player = "Dark" if self.game.current_player == 1 else "Light"
+            self.log("{}: pass".format(player))
+            self.game.pass_turn()
+        return state
+
+    def record_move(self, i, j):
+        now = time.perf_counter()
+        self.game_record.add_move(i, j, now - self.move_start)
+        self.move_start = now
+
     def shutdown(self, text):
         self.move_label["text"] = text 
         self.root.unbind("<Button-1>")
+        if self.record is not None:
+            self.game_record.score = get_score(self.game.board)
+            write_record(self.record, self.game_record)
         if isinstance(self.players[1], AiPlayerInterface): 
             self.players[1].kill(self.game)
         if isinstance(self.players[2], AiPlayerInterface): 
             self.players[2].kill(self.game)
  
     def ai_move(self):
+        """
+        Ask the AI to move on a background thread and poll for its answer
+        from the Tk main loop, so the window stays responsive meanwhile.
+        """
         player_obj = self.players[self.game.current_player]
+        player_obj.on_info = lambda info: self.results.put(("info", info))
+        threading.Thread(target=self.think, args=(player_obj,), daemon=True).start()
+        self.poll_ai(player_obj, time.perf_counter(), {})
+
+    def think(self, player_obj):
+        # Runs on the background thread: only the queue is shared with Tk
         try:
-            i,j = player_obj.get_move(self.game)
-            player = "Dark" if self.game.current_player == 1 else "Light"
-            player = "{} {}".format(player_obj.name, player)
-            self.log("{}: {},{}".format(player, i,j))
-            self.game.play(i,j)
-            self.draw_board()
-            if not get_possible_moves(self.game.board, self.game.current_player):
-                self.shutdown("Game Over")
-            elif isinstance(self.players[self.game.current_player], AiPlayerInterface):
-                self.root.after(1, lambda: self.ai_move())
-            else: 
-                self.root.bind("<Button-1>",lambda e: self.mouse_pressed(e))        
+            self.results.put(("move", player_obj.get_move(self.game)))
         except AiTimeoutError:
+            self.results.put(("timeout", None))
+        except (OSError, ValueError) as e:
+            self.results.put(("error", e))
+
+    def poll_ai(self, player_obj, start, info):
+        """
+        Handle what the thinking AI has posted so far, showing its progress,
+        and check again after POLL_INTERVAL until it has moved.
+        """
+        while True:
+            try:
+                kind, value = self.results.get_nowait()
+            except queue.Empty:
+                self.show_thinking(player_obj, start, info)
+                self.root.after(self.POLL_INTERVAL, lambda: self.poll_ai(player_obj, start, info))
+                return
+            if kind != "info":
+                break
+            self.handle_info(info, value)
+        if kind == "timeout":
             self.shutdown("Game Over, {} lost (timeout)".format(player_obj.name))
+        elif kind == "error":
+            self.shutdown("Game Over, {} failed ({})".format(player_obj.name, value))
+        else:
+            self.ai_played(player_obj, *value)
+
+    def handle_info(self, info, value):
+        """
+        Take in an INFO line of the thinking AI: its progress for the move
+        label and, in analysis mode, the summary of each search depth in the
+        analysis label and the log and the score of every root move it
+        reports on the board.
+        """
+        if "currmove" in value:
+            if self.analysis:
+                i, j = (int(x) for x in value["currmove"].split(","))
+                self.canvas.itemconfigure(self.score_items[j][i], text=value["score"])
+                self.scored.append(self.score_items[j][i])
+            return
+        info.update(value)
+        if self.analysis:
+            # The currmove lines of this depth follow its summary
+            self.clear_scores()
+            text = "depth {}: score {}, {} nodes, {} nodes/s, pv {}".format(
+                value.get("depth"), value.get("score"), value.get("nodes"), value.get("nps"), " ".join(value.get("pv", [])))
+            self.analysis_label["text"] = text
+            self.log("  " + text)
+
+    def clear_scores(self):
+        for item in self.scored:
+            self.canvas.itemconfigure(item, text="")
+        self.scored = []
+
+    def show_thinking(self, player_obj, start, info):
+        player = "Dark" if self.game.current_player == 1 else "Light"
+        text = "{} ({}) thinking {:.1f}s".format(player, player_obj.name, time.perf_counter() - start)
+        if info:
+            text += ", depth {} done, {} nodes".format(info.get("depth", "?"), info.get("nodes", "?"))
+        self.move_label["text"] = text
+
+    def ai_played(self, player_obj, i, j):
+        player = "Dark" if self.game.current_player == 1 else "Light"
+        player = "{} {}".format(player_obj.name, player)
+        self.log("{}: {},{}".format(player, i,j))
+        self.game.play(i,j)
+        self.record_move(i, j)
+        state = self.skip_passes()
+        self.clear_scores()
+        self.draw_board()
+        if state == GAME_OVER:
+            self.shutdown("Game Over")
+        elif isinstance(self.players[self.game.current_player], AiPlayerInterface):
+            self.root.after(1, lambda: self.ai_move())
+        else: 
+            self.root.bind("<Button-1>",lambda e: self.mouse_pressed(e))        
 
     def run(self):
         if isinstance(self.players[1], AiPlayerInterface):
@@ -96,7 +209,6 @@ class OthelloGui(object):
         self.canvas.mainloop()
 
     def draw_board(self):
-        self.draw_grid()
         self.draw_disks()
         player = "Dark" if self.game.current_player == 1 else "Light"
         self.move_label["text"]= player
@@ -107,23 +219,71 @@ class OthelloGui(object):
         self.text.see("end")
  
     def draw_grid(self):
-        for i in range(self.height):
-            for j in range(self.width):
-                self.canvas.create_rectangle(i*self.cell_size + self.offset, j*self.cell_size + self.offset, (i+1)*self.cell_size + self.offset, (j+1)*self.cell_size + self.offset, fill="dark green")
-       
+        """
+        Create the canvas items once: a square, a hidden disc and an empty
+        score text for every cell. Drawing a move only reconfigures the discs
+        that changed.
+        """
+        padding = 2
+        self.disks = []
+        self.score_items = []
+        for j in range(self.height):
+            row = []
+            score_row = []
+            for i in range(self.width):
+                x = i * self.cell_size + self.offset
+                y = j * self.cell_size + self.offset
+                self.canvas.create_rectangle(x, y, x+self.cell_size, y+self.cell_size, fill="dark green")
+                row.append(self.canvas.create_oval(x+padding, y+padding, x+self.cell_size-padding, y+self.cell_size-padding, state="hidden"))
+                score_row.append(self.canvas.create_text(x+self.cell_size//2, y+self.cell_size//2, text="", fill="yellow"))
+            self.disks.append(row)
+            self.score_items.append(score_row)
+
     def draw_disk(self, i,j, color):
-        x = i * self.cell_size + self.offset
-        y = j * self.cell_size + self.offset
-        padding =2 
-        self.canvas.create_oval(x+padding, y+padding, x+self.cell_size-padding, y+self.cell_size-padding, fill=color)
-        
+        if color is None:
+            self.canvas.itemconfigure(self.disks[j][i], state="hidden")
+        else:
+            self.canvas.itemconfigure(self.disks[j][i], state="normal", fill=color)
+
     def draw_disks(self):
-        for i in range(self.height): 
-            for j  in range(self.width): 
-                if self.game.board[i][j] == 1:
-                    self.draw_disk(j, i, "black")
-                elif self.game.board[i][j] == 2:
-                    self.draw_disk(j, i, "white")
+        colors = [None, "black", "white"]
+        for j, row in enumerate(self.game.board):
+            # Rows are tuples, so unchanged rows are skipped with one comparison
+            if self.shown is not None and row == self.shown[j]:
+                continue
+            for i, cell in enumerate(row):
+                if self.shown is None or cell != self.shown[j][i]:
+                    self.draw_disk(i, j, colors[cell])
+        self.shown = self.game.board
+
+
+def measure_frames(dimension, seed=0):
+    """
+    Play a game of random moves in the GUI and print how long drawing each
+    move took, rendering included, and the number of canvas items left.
+    """
+    game = OthelloGameManager(dimension)
+    gui = OthelloGui(game, Player(1), Player(2))
+    gui.root.update()
+    rng = random.Random(seed)
+    frame_times = []
+    while True:
+        moves, state = game.get_game_state()
+        if state == GAME_OVER:
+            break
+        if state == PASS:
+            game.pass_turn()
+            continue
+        game.play(*rng.choice(moves))
+        start = time.perf_counter()
+        gui.draw_board()
+        gui.root.update()
+        frame_times.append(time.perf_counter() - start)
+    frame_times.sort()
+    print("{}x{}: {} frames, median {:.2f} ms, slowest {:.2f} ms, {} canvas items".format(
+        dimension, dimension, len(frame_times), frame_times[len(frame_times) // 2] * 1000,
+        frame_times[-1] * 1000, len(gui.canvas.find_all())))
+    gui.root.destroy()
 
 def main(argv):
 
@@ -134,15 +294,20 @@ def main(argv):
     minimax = False        
     agent1 = None
     agent2 = None
+    time_control = None
+    frames = False
+    analysis = False
+    record = None
+    options = {}
 
     try:
-        opts, args = getopt.getopt(argv,"hcmol:d:a:b:",["limit=","dimension=","agent1=","agent2="])
+        opts, args = getopt.getopt(argv,"hcmofil:d:a:b:t:r:p:",["limit=","dimension=","agent1=","agent2=","time=","frames","analysis","record=","option="])
     except getopt.GetoptError:
-        print('othello_gui.py -d <dimension> [-a <agentA> -b <agentB> -l <depth-limit> -c -o -m]')
+        print('othello_gui.py -d <dimension> [-a <agentA> -b <agentB> -l <depth-limit> -t <time-control> -c -o -m -i -r <record-file> -p <key>=<value> ... | -f]')
         sys.exit(2)
     for opt, arg in opts:
         if opt == '-h':
-            print('othello_gui.py -d <dimension> -a <agentA> [-b <agentB> -l <depth-limit> -c -o]')
+            print('othello_gui.py -d <dimension> -a <agentA> [-b <agentB> -l <depth-limit> -t <time-control> -c -o]')
             sys.exit()
         elif opt in ("-d", "--dimension"):
             size = int(arg)
@@ -158,24 +323,39 @@ def main(argv):
             ordering = True   
         elif opt in ("-l", "--limit"):
             limit = int(arg)  
+        elif opt in ("-t", "--time"): # "move:<seconds>" or "game:<seconds>+<increment>"
+            time_control = arg
+        elif opt in ("-f", "--frames"): # time the drawing of a random game instead of playing
+            frames = True
+        elif opt in ("-i", "--analysis"): # show the depths, scores and pv of the AIs' searches
+            analysis = True
+        elif opt in ("-r", "--record"): # append the game to a record file, see game_record.py
+            record = arg
+        elif opt in ("-p", "--option"): # added to the AIs' configuration line, e.g. -p workers=4
+            key, _, value = arg.partition("=")
+            options[key] = value
 
     if size <= 0: #if no dimension provided
         print('Please provide a board size.')
-        print('othello_gui.py -d <dimension> [-a <agentA> -b <agentB> -l <depth-limit> -c -o]')
+        print('othello_gui.py -d <dimension> [-a <agentA> -b <agentB> -l <depth-limit> -t <time-control> -c -o]')
         sys.exit(2)  
 
+    if frames:
+        measure_frames(size)
+        return
+
     if agent1 != None and agent2 != None and size > 0:
-        p1 = AiPlayerInterface(agent1,1,limit,minimax,caching,ordering)
-        p2 = AiPlayerInterface(agent2,2,limit,minimax,caching,ordering)        
+        p1 = AiPlayerInterface(agent1,1,limit,minimax,caching,ordering,time_control=time_control,info=True,options=options)
+        p2 = AiPlayerInterface(agent2,2,limit,minimax,caching,ordering,time_control=time_control,info=True,options=options)
     elif agent1 != None and size > 0:
         p1 = Player(1)
-        p2 = AiPlayerInterface(agent1,2,limit,minimax,caching,ordering)
+        p2 = AiPlayerInterface(agent1,2,limit,minimax,caching,ordering,time_control=time_control,info=True,options=options)
     else: 
         p1 = Player(1)
         p2 = Player(2)
         
     game = OthelloGameManager(size)
-    gui = OthelloGui(game, p1, p2) 
+    gui = OthelloGui(game, p1, p2, analysis, record)
     gui.run()
 
 if __name__ == "__main__":
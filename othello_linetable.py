@@ -0,0 +1,144 @@
+"""
+Table-driven move generation for Othello, a backend for othello_shared.
+
+What a move captures along one direction depends only on the contents of
+the squares it looks along, the ray of othello_raytable, so it can be
+looked up instead of walked. For every ray length there is a table from
+each pattern of cells (0 empty, 1 dark, 2 light) to the number of squares
+captured by a dark and by a light move at the start of the ray. A ray's
+pattern is read with one operator.itemgetter call over the flat board, so
+legality and play_move are a lookup per direction.
+
+Ray lengths up to PRECOMPUTED_LENGTH (every ray of an 8x8 board) have their
+3**length patterns computed when the first board of that size is seen.
+Longer rays have too many patterns for that and fill their table as
+patterns are met, until it holds MAX_PATTERNS; later patterns are computed
+each time they are met.
+"""
+from operator import itemgetter
+
+from othello_shared import PLAYING, PASS, GAME_OVER
+from othello_raytable import get_rays
+
+PRECOMPUTED_LENGTH = 7
+MAX_PATTERNS = 100000  # about 30 MB, rays of a 16x16 board have up to 3**15 patterns
+
+
+def captures(pattern):
+    """
+    Return (0, squares captured by dark, squares captured by light) for a
+    move in front of the cells of pattern, indexed by player.
+    """
+    result = [0, 0, 0]
+    first = pattern[0]
+    if first:
+        for k, cell in enumerate(pattern):
+            if cell != first:
+                if cell:
+                    result[cell] = k
+                break
+    return tuple(result)
+
+
+class FlipTable(dict):
+    """
+    Map from a ray pattern to its captures, computing missing patterns and
+    keeping them while there are fewer than MAX_PATTERNS.
+    """
+
+    def __missing__(self, pattern):
+        result = captures(pattern)
+        if len(self) < MAX_PATTERNS:
+            self[pattern] = result
+        return result
+
+
+flip_table = FlipTable()
+precomputed = set()  # ray lengths whose patterns are all in flip_table
+line_tables = {}  # dimension -> [((first square, itemgetter of the ray, ray), ...)] for every flat square
+
+
+def precompute(length):
+    """
+    Add every pattern of length cells to flip_table.
+    """
+    patterns = [()]
+    for k in range(length):
+        patterns = [pattern + (cell,) for pattern in patterns for cell in (0, 1, 2)]
+    for pattern in patterns:
+        flip_table[pattern] = captures(pattern)
+    precomputed.add(length)
+
+
+def get_lines(dimension):
+    """
+    Return, for every flat square j*dimension+i, a (first square, itemgetter,
+    ray) triple for each of its rays, precomputing the tables of their
+    lengths.
+    """
+    if dimension not in line_tables:
+        table = []
+        for rays in get_rays(dimension):
+            table.append(tuple((ray[0], itemgetter(*ray), ray) for ray in rays))
+        for length in range(2, min(dimension - 1, PRECOMPUTED_LENGTH) + 1):
+            if length not in precomputed:
+                precompute(length)
+        line_tables[dimension] = table
+    return line_tables[dimension]
+
+
+def find_lines(board, i, j, player):
+    dimension = len(board)
+    cells = sum(board, ())
+    lines = []
+    for first, getter, ray in get_lines(dimension)[j * dimension + i]:
+        k = flip_table[getter(cells)][player]
+        if k:
+            lines.append([(square % dimension, square // dimension) for square in ray[:k]])
+    return lines
+
+
+def get_possible_moves(board, player):
+    return get_game_state(board, player)[0]
+
+
+def get_game_state(board, player):
+    dimension = len(board)
+    cells = sum(board, ())
+    lines = get_lines(dimension)
+    opponent = 1 if player == 2 else 2
+    result = []
+    opponent_can_move = False
+    # Column by column, so moves come out in the order of the tuple backend
+    for i in range(dimension):
+        for square in range(i, dimension * dimension, dimension):
+            if cells[square] == 0:
+                for first, getter, ray in lines[square]:
+                    # Nothing is captured next to an empty square, skip the lookup
+                    if not cells[first]:
+                        continue
+                    captured = flip_table[getter(cells)]
+                    if captured[player]:
+                        result.append((i, square // dimension))
+                        break
+                    if captured[opponent]:
+                        opponent_can_move = True
+    if result:
+        return result, PLAYING
+    if opponent_can_move:
+        return result, PASS
+    return result, GAME_OVER
+
+
+def play_move(board, player, i, j):
+    dimension = len(board)
+    cells = list(sum(board, ()))
+    square = j * dimension + i
+    for first, getter, ray in get_lines(dimension)[square]:
+        if cells[first] == player or not cells[first]:
+            continue
+        k = flip_table[getter(cells)][player]
+        for captured in ray[:k]:
+            cells[captured] = player
+    cells[square] = player
+    return tuple(tuple(cells[k:k + dimension]) for k in range(0, dimension * dimension, dimension))
@@ -0,0 +1,177 @@
+"""
+NumPy move generation for Othello, a backend for othello_shared. Needs
+numpy, which the other backends do not.
+
+Boards are int8 arrays indexed [row, column]. Every helper works on arrays
+with any number of leading dimensions, so the same code moves one board or
+a whole stack of them; for a single board the array overhead makes it
+slower than the pure Python backends. The batch_* functions, re-exported by
+othello_shared, work on a stack of N boards of shape (N, dimension,
+dimension) with one player per board.
+"""
+import itertools
+
+import numpy as np
+
+from othello_shared import PLAYING, PASS, GAME_OVER
+
+DIRECTIONS = [(0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1)]
+
+
+def span(d):
+    """
+    Return the (destination, source) slices along one axis for a step of d.
+    """
+    if d > 0:
+        return slice(d, None), slice(None, -d)
+    if d < 0:
+        return slice(None, d), slice(-d, None)
+    return slice(None), slice(None)
+
+
+def shift(a, xdir, ydir):
+    """
+    Move every square of the boolean array a one step in direction
+    (xdir, ydir), dropping what falls off the edge.
+    """
+    out = np.zeros_like(a)
+    to_row, from_row = span(ydir)
+    to_column, from_column = span(xdir)
+    out[..., to_row, to_column] = a[..., from_row, from_column]
+    return out
+
+
+def mobility(own, opp):
+    """
+    Return the boolean mask of the empty squares where the owner of the
+    stones in own can capture.
+    """
+    dimension = own.shape[-1]
+    empty = ~(own | opp)
+    moves = np.zeros_like(own)
+    for xdir, ydir in DIRECTIONS:
+        x = shift(own, xdir, ydir) & opp
+        for k in range(dimension - 3):
+            x |= shift(x, xdir, ydir) & opp
+        moves |= shift(x, xdir, ydir) & empty
+    return moves
+
+
+def captured(own, opp, move):
+    """
+    Return the mask of the stones captured by playing the single square set
+    in the mask move, for each board.
+    """
+    dimension = own.shape[-1]
+    flipped = np.zeros_like(own)
+    for xdir, ydir in DIRECTIONS:
+        x = shift(move, xdir, ydir) & opp
+        for k in range(dimension - 3):
+            x |= shift(x, xdir, ydir) & opp
+        closed = (shift(x, xdir, ydir) & own).any(axis=(-2, -1), keepdims=True)
+        flipped |= x & closed
+    return flipped
+
+
+def sides(board, player):
+    cells = np.asarray(board, dtype=np.int8)
+    return cells == player, cells == (1 if player == 2 else 2)
+
+
+def find_lines(board, i, j, player):
+    own, opp = sides(board, player)
+    dimension = own.shape[-1]
+    lines = []
+    for xdir, ydir in DIRECTIONS:
+        u, v = i + xdir, j + ydir
+        line = []
+        while 0 <= u < dimension and 0 <= v < dimension and opp[v, u]:
+            line.append((u, v))
+            u += xdir
+            v += ydir
+        if line and 0 <= u < dimension and 0 <= v < dimension and own[v, u]:
+            lines.append(line)
+    return lines
+
+
+def move_list(moves):
+    # argwhere on the transpose yields (column, row) in the tuple backend's order
+    return [(int(i), int(j)) for i, j in np.argwhere(moves.T)]
+
+
+def get_possible_moves(board, player):
+    own, opp = sides(board, player)
+    return move_list(mobility(own, opp))
+
+
+def get_game_state(board, player):
+    own, opp = sides(board, player)
+    moves = mobility(own, opp)
+    if moves.any():
+        return move_list(moves), PLAYING
+    if mobility(opp, own).any():
+        return [], PASS
+    return [], GAME_OVER
+
+
+def play_move(board, player, i, j):
+    cells = np.array(board, dtype=np.int8)
+    own, opp = cells == player, cells == (1 if player == 2 else 2)
+    move = np.zeros_like(own)
+    move[j, i] = True
+    cells[captured(own, opp, move) | move] = player
+    return tuple(map(tuple, cells.tolist()))
+
+
+def batch_array(boards):
+    """
+    Return boards, a sequence of tuple boards or an array, as an int8 array
+    of shape (N, dimension, dimension). Convert once and pass the array when
+    calling several batch functions on the same boards.
+    """
+    if isinstance(boards, np.ndarray):
+        return boards.astype(np.int8, copy=False).reshape((-1,) + boards.shape[-2:])
+    dimension = len(boards[0])
+    # Much faster than np.array on nested tuples
+    cells = bytes(itertools.chain.from_iterable(itertools.chain.from_iterable(boards)))
+    return np.frombuffer(cells, dtype=np.int8).reshape(-1, dimension, dimension)
+
+
+def batch_sides(cells, players):
+    players = np.broadcast_to(np.asarray(players, dtype=np.int8), cells.shape[:1])[:, None, None]
+    return cells == players, cells == 3 - players
+
+
+def batch_legal_moves(boards, players):
+    """
+    Return a boolean array of shape (N, dimension, dimension), indexed
+    [board, row, column], that is True where the player of each board can
+    move. players is a single color or one color per board.
+    """
+    cells = batch_array(boards)
+    return mobility(*batch_sides(cells, players))
+
+
+def batch_play_moves(boards, players, moves):
+    """
+    Play one move on each board. moves is a sequence of (column, row) pairs,
+    one per board, that must be legal. Returns the new boards as an int8
+    array and the number of stones each move flipped.
+    """
+    cells = batch_array(boards)
+    own, opp = batch_sides(cells, players)
+    moves = np.asarray(moves, dtype=np.intp).reshape(-1, 2)
+    move = np.zeros_like(own)
+    move[np.arange(len(cells)), moves[:, 1], moves[:, 0]] = True
+    flipped = captured(own, opp, move)
+    colors = np.broadcast_to(np.asarray(players, dtype=np.int8), cells.shape[:1])[:, None, None]
+    return np.where(flipped | move, colors, cells), flipped.sum(axis=(1, 2))
+
+
+def batch_scores(boards):
+    """
+    Return an array of shape (N, 2) with the dark and light stone counts of
+    every board.
+    """
+    cells = batch_array(boards)
+    return np.stack([(cells == 1).sum(axis=(1, 2)), (cells == 2).sum(axis=(1, 2))], axis=1)
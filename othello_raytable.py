@@ -0,0 +1,115 @@
+"""
+Ray-table move generation for Othello, a backend for othello_shared.
+
+The board is flattened into a single tuple and every square has a
+precomputed list of rays: the flat indices walked in each direction until
+the edge. Checking a move is then a walk along a few short tuples, without
+the bounds tests and coordinate arithmetic of the tuple backend.
+"""
+from othello_shared import PLAYING, PASS, GAME_OVER
+
+DIRECTIONS = [(0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1)]
+
+ray_tables = {}  # dimension -> rays for every flat square, in the same order as the squares
+
+
+def get_rays(dimension):
+    """
+    Return the ray table for dimension: for flat square j*dimension+i the list
+    of rays with at least two squares, each a tuple of flat indices.
+    """
+    if dimension not in ray_tables:
+        table = []
+        for square in range(dimension * dimension):
+            j, i = divmod(square, dimension)
+            rays = []
+            for xdir, ydir in DIRECTIONS:
+                u, v = i + xdir, j + ydir
+                ray = []
+                while 0 <= u < dimension and 0 <= v < dimension:
+                    ray.append(v * dimension + u)
+                    u += xdir
+                    v += ydir
+                if len(ray) >= 2: # a capture needs an opponent stone and one of our own
+                    rays.append(tuple(ray))
+            table.append(rays)
+        ray_tables[dimension] = table
+    return ray_tables[dimension]
+
+
+def flips(cells, rays, player):
+    """
+    Return the flat indices captured along rays, one list per ray that
+    captures anything.
+    """
+    lines = []
+    for ray in rays:
+        line = []
+        for square in ray:
+            cell = cells[square]
+            if cell == 0:
+                break
+            if cell == player:
+                if line:
+                    lines.append(line)
+                break
+            line.append(square)
+    return lines
+
+
+def can_capture(cells, rays, player):
+    for ray in rays:
+        cell = cells[ray[0]]
+        if cell == 0 or cell == player:
+            continue
+        for square in ray[1:]:
+            cell = cells[square]
+            if cell == player:
+                return True
+            if cell == 0:
+                break
+    return False
+
+
+def find_lines(board, i, j, player):
+    dimension = len(board)
+    cells = sum(board, ())
+    lines = flips(cells, get_rays(dimension)[j * dimension + i], player)
+    return [[(square % dimension, square // dimension) for square in line] for line in lines]
+
+
+def get_possible_moves(board, player):
+    return get_game_state(board, player)[0]
+
+
+def get_game_state(board, player):
+    dimension = len(board)
+    cells = sum(board, ())
+    rays = get_rays(dimension)
+    opponent = 1 if player == 2 else 2
+    result = []
+    opponent_can_move = False
+    # Column by column, so moves come out in the order of the tuple backend
+    for i in range(dimension):
+        for square in range(i, dimension * dimension, dimension):
+            if cells[square] == 0:
+                if can_capture(cells, rays[square], player):
+                    result.append((i, square // dimension))
+                elif not (result or opponent_can_move) and can_capture(cells, rays[square], opponent):
+                    opponent_can_move = True
+    if result:
+        return result, PLAYING
+    if opponent_can_move:
+        return result, PASS
+    return result, GAME_OVER
+
+
+def play_move(board, player, i, j):
+    dimension = len(board)
+    cells = list(sum(board, ()))
+    square = j * dimension + i
+    for line in flips(cells, get_rays(dimension)[square], player):
+        for captured in line:
+            cells[captured] = player
+    cells[square] = player
+    return tuple(tuple(cells[k:k + dimension]) for k in range(0, dimension * dimension, dimension))
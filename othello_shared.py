@@ -4,7 +4,23 @@ and by the each AI player. Feel free to call these functions when
 building your AIs. 
 
 Thanks to original author Daniel Bauer, Columbia University
+
+get_possible_moves, get_game_state and play_move come from the move
+generation backend named by the OTHELLO_BACKEND environment variable
+("tuples" unless it is set), see use_backend. The batch_* functions work
+on many boards at once and need numpy.
 """
+import importlib
+import os
+import random
+import types
+
+# Game states reported by get_game_state
+PLAYING = 0    # the player to move has at least one legal move
+PASS = 1       # the player to move has no legal move, but the opponent does
+GAME_OVER = 2  # neither player can move
+
+DIRECTIONS = ((0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1))
 
 def find_lines(board, i, j, player):
     """
@@ -12,8 +28,7 @@ def find_lines(board, i, j, player):
     plays column i and row j. 
     """
     lines = []
-    for xdir, ydir in [[0, 1], [1, 1], [1, 0], [1, -1], [0, -1], [-1, -1], 
-                       [-1, 0], [-1, 1]]:
+    for xdir, ydir in DIRECTIONS:
         u = i
         v = j
         line = []
@@ -50,19 +65,47 @@ def get_possible_moves(board, player):
                     result.append((i,j))
     return result
 
+def get_game_state(board, player):
+    """
+    Return a (moves, state) pair for the player to move, where moves is the
+    same list get_possible_moves would return and state is one of PLAYING,
+    PASS or GAME_OVER.
+
+    Both colors are tested in the same scan over the empty squares. The
+    opponent is only checked until either side is known to have a move, so in
+    the common PLAYING case this costs little more than get_possible_moves.
+    """
+    opponent = 1 if player == 2 else 2
+    result = []
+    opponent_can_move = False
+    for i in range(len(board)):
+        for j in range(len(board)):
+            if board[j][i] == 0:
+                if find_lines(board, i, j, player):
+                    result.append((i, j))
+                elif not (result or opponent_can_move) and find_lines(board, i, j, opponent):
+                    opponent_can_move = True
+    if result:
+        return result, PLAYING
+    if opponent_can_move:
+        return result, PASS
+    return result, GAME_OVER
+
 def play_move(board, player, i, j):
-    new_board = []
-    for row in board: 
-        new_board.append(list(row[:]))
-    lines = find_lines(board, i,j, player)
-    new_board[j][i] = player
-    for line in lines: 
-        for u,v in line: 
-           new_board[v][u] = player 
-    final = []
-    for row in new_board: 
-        final.append(tuple(row))
-    return tuple(final) 
+    # Only the rows with a captured stone are copied, the new board shares
+    # the others with board when they are tuples. Rows of a list board are
+    # converted, so the result is always a board of fresh or immutable rows
+    rows = {j: list(board[j])}
+    rows[j][i] = player
+    for line in find_lines(board, i, j, player):
+        for u, v in line:
+            if v not in rows:
+                rows[v] = list(board[v])
+            rows[v][u] = player
+    new_board = [row if type(row) is tuple else tuple(row) for row in board]
+    for v, row in rows.items():
+        new_board[v] = tuple(row)
+    return tuple(new_board)
 
 def get_score(board):
     p1_count = 0
@@ -74,3 +117,118 @@ def get_score(board):
             elif board[i][j] == 2:
                 p2_count += 1
     return p1_count, p2_count
+
+zobrist_tables = {}  # dimension -> (square keys, light-to-move key)
+
+def position_hash(board, player=1):
+    """
+    Return a 64-bit Zobrist hash of board with player to move. The keys are
+    generated from a fixed seed, so hashes are stable across processes and
+    can be stored on disk.
+    """
+    dimension = len(board)
+    if dimension not in zobrist_tables:
+        rng = random.Random(dimension)
+        keys = [[rng.getrandbits(64) for k in range(3)] for square in range(dimension * dimension)]
+        zobrist_tables[dimension] = (keys, rng.getrandbits(64))
+    keys, side_key = zobrist_tables[dimension]
+    h = side_key if player == 2 else 0
+    square = 0
+    for row in board:
+        for cell in row:
+            if cell:
+                h ^= keys[square][cell]
+            square += 1
+    return h
+
+# Move generation backends: name -> module providing find_lines,
+# get_possible_moves, get_game_state and play_move with the same arguments
+# and results as the tuple code above. None is the tuple code itself.
+BACKEND_MODULES = {
+    "tuples": None,
+    "raytable": "othello_raytable",
+    "linetable": "othello_linetable",
+    "bitboard": "othello_bitboard",
+    "numpy": "othello_numpy",
+}
+BACKEND_FUNCTIONS = ("find_lines", "get_possible_moves", "get_game_state", "play_move")
+# find_lines stays the tuple version, the tuple backend is built on it
+SELECTED_FUNCTIONS = ("get_possible_moves", "get_game_state", "play_move")
+
+backends = {"tuples": types.SimpleNamespace(name="tuples", find_lines=find_lines,
+                                            get_possible_moves=get_possible_moves,
+                                            get_game_state=get_game_state,
+                                            play_move=play_move)}
+
+def load_backend(name):
+    """
+    Return a namespace with the name and the functions of a backend.
+    Raises ValueError for an unknown name and ImportError if the backend
+    needs a module that is not installed.
+    """
+    if name not in backends:
+        if name not in BACKEND_MODULES:
+            raise ValueError("Unknown backend {}, choose one of {}".format(name, ", ".join(BACKEND_MODULES)))
+        module = importlib.import_module(BACKEND_MODULES[name])
+        functions = {function: getattr(module, function) for function in BACKEND_FUNCTIONS}
+        backends[name] = types.SimpleNamespace(name=name, **functions)
+    return backends[name]
+
+def available_backends():
+    """
+    Return the names of the backends that can be loaded here.
+    """
+    names = []
+    for name in BACKEND_MODULES:
+        try:
+            load_backend(name)
+        except ImportError:
+            continue
+        names.append(name)
+    return names
+
+def use_backend(name):
+    """
+    Make the functions of backend name the ones exported by this module.
+    Modules that already imported them keep the old ones, so call this before
+    importing the game manager or an AI, or set OTHELLO_BACKEND, which AI
+    subprocesses inherit.
+    """
+    global backend_name
+    backend = load_backend(name)
+    for function in SELECTED_FUNCTIONS:
+        globals()[function] = getattr(backend, function)
+    backend_name = name
+
+use_backend(os.environ.get("OTHELLO_BACKEND", "tuples"))
+
+# Batch move generation with numpy, imported on first use so the rest of
+# this module works without it. See othello_numpy for the details.
+
+def batch_array(boards):
+    """
+    Return a sequence of boards as an int8 array of shape (N, dimension,
+    dimension), to convert once for several batch calls.
+    """
+    return importlib.import_module("othello_numpy").batch_array(boards)
+
+def batch_legal_moves(boards, players):
+    """
+    Return a boolean array of shape (N, dimension, dimension), indexed
+    [board, row, column], of the legal moves on each of N boards for the
+    player of that board (one color, or one per board).
+    """
+    return importlib.import_module("othello_numpy").batch_legal_moves(boards, players)
+
+def batch_play_moves(boards, players, moves):
+    """
+    Play one legal (column, row) move on each board. Returns the new boards
+    as an int8 array and the number of stones flipped on each.
+    """
+    return importlib.import_module("othello_numpy").batch_play_moves(boards, players, moves)
+
+def batch_scores(boards):
+    """
+    Return an (N, 2) array of the dark and light stone counts of each board.
+    """
+    return importlib.import_module("othello_numpy").batch_scores(boards)
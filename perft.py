@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Perft for Othello: count the leaf nodes of the full game tree to a fixed
+depth from the starting position. It measures get_game_state/play_move on
+their own, without any search or evaluation, and checks them against known
+counts.
+
+A pass counts as a ply and a position where neither side can move is a leaf
+even above the requested depth. The 8x8 counts are the published ones, the
+6x6 and 4x4 counts were computed with the tuple code in othello_shared and
+confirmed with an independent bitboard implementation.
+
+conformance() is the test every move generation backend in othello_shared
+must pass: it replays random games and compares every function of the
+backend with the tuple code on each position. With -b all, both the
+conformance test and perft run for every backend that can be loaded here,
+followed by a speed report.
+
+--batch instead times the numpy batch functions of othello_shared against a
+loop over the selected backend, on random positions in batches of 1, 100
+and 10,000 boards.
+
+Usage: python3 perft.py [-d <dimension>] [-n <max-depth>] [-b <backend>,...|all] [--batch]
+"""
+import sys, getopt
+import random
+import time
+
+from othello_game import OthelloGameManager
+from othello_shared import (PLAYING, PASS, GAME_OVER, available_backends, load_backend, get_score,
+                            batch_array, batch_legal_moves, batch_play_moves, batch_scores)
+
+REFERENCE_COUNTS = {
+    4: [1, 4, 12, 44, 128, 424, 1256, 3624, 9116, 20044, 36540, 50704, 57436, 59564, 59980],
+    6: [1, 4, 12, 56, 244, 1364, 7604, 47740, 308716, 2114912, 14976792],
+    8: [1, 4, 12, 56, 244, 1396, 8200, 55092, 390216, 3005288, 24571284],
+}
+
+
+def perft(board, player, depth, backend):
+    """
+    Return the number of leaf nodes depth plies below board, with player to
+    move. The last ply is counted from the move list without playing it.
+    """
+    if depth == 0:
+        return 1
+    moves, state = backend.get_game_state(board, player)
+    if state == GAME_OVER:
+        return 1
+    opponent = 1 if player == 2 else 2
+    if state == PASS:
+        return perft(board, opponent, depth - 1, backend)
+    if depth == 1:
+        return len(moves)
+    play_move = backend.play_move
+    total = 0
+    for i, j in moves:
+        total += perft(play_move(board, player, i, j), opponent, depth - 1, backend)
+    return total
+
+
+def run(dimension, max_depth, backend):
+    """
+    Run perft for depths 1 to max_depth and print counts, time and speed.
+    Returns the number of depths whose count differs from the reference.
+    """
+    board = OthelloGameManager(dimension).board
+    reference = REFERENCE_COUNTS.get(dimension, [])
+    errors = 0
+    print("perft {}x{} with {}".format(dimension, dimension, backend.name))
+    for depth in range(1, max_depth + 1):
+        start = time.perf_counter()
+        count = perft(board, 1, depth, backend)
+        elapsed = time.perf_counter() - start
+        if depth < len(reference):
+            status = "ok" if count == reference[depth] else "MISMATCH (expected {})".format(reference[depth])
+            errors += count != reference[depth]
+        else:
+            status = "no reference"
+        print("depth {:2} {:>12} leaves {:8.2f}s {:>12.0f} leaves/s  {}".format(depth, count, elapsed, count / max(elapsed, 1e-9), status))
+    return errors
+
+
+def conformance(backend, dimensions = (4, 6, 8), n_games = 10, seed = 0):
+    """
+    Play n_games random games on each board size and compare find_lines on
+    every empty square, get_possible_moves and get_game_state for both
+    colors, and play_move for every legal move with the tuple backend.
+    Returns the number of positions where the backend disagrees.
+    """
+    reference = load_backend("tuples")
+    rng = random.Random(seed)
+    errors = 0
+    for dimension in dimensions:
+        for game in range(n_games):
+            board = OthelloGameManager(dimension).board
+            player = 1
+            while True:
+                moves, state = reference.get_game_state(board, player)
+                ok = True
+                for color in (1, 2):
+                    ok = ok and backend.get_game_state(board, color) == reference.get_game_state(board, color)
+                    ok = ok and backend.get_possible_moves(board, color) == reference.get_possible_moves(board, color)
+                    for i in range(dimension):
+                        for j in range(dimension):
+                            if board[j][i] == 0:
+                                ok = ok and backend.find_lines(board, i, j, color) == reference.find_lines(board, i, j, color)
+                for i, j in moves:
+                    ok = ok and backend.play_move(board, player, i, j) == reference.play_move(board, player, i, j)
+                errors += not ok
+                if state == GAME_OVER:
+                    break
+                if state == PLAYING:
+                    i, j = rng.choice(moves)
+                    board = reference.play_move(board, player, i, j)
+                player = 1 if player == 2 else 2
+    return errors
+
+
+def random_positions(n_positions, dimension, seed = 0):
+    """
+    Return n_positions (board, player, move) triples from random games,
+    where player has at least one legal move and move is one of them.
+    """
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < n_positions:
+        board = OthelloGameManager(dimension).board
+        player = 1
+        while len(positions) < n_positions:
+            moves, state = load_backend("tuples").get_game_state(board, player)
+            if state == GAME_OVER:
+                break
+            if state == PLAYING:
+                move = rng.choice(moves)
+                positions.append((board, player, move))
+                board = load_backend("tuples").play_move(board, player, move[0], move[1])
+            player = 1 if player == 2 else 2
+    return positions
+
+
+def batch_conformance(n_positions = 500, dimensions = (4, 6, 8)):
+    """
+    Compare the batch functions with the tuple code on random positions of
+    each board size. Returns the number of positions where they disagree.
+    """
+    reference = load_backend("tuples")
+    errors = 0
+    for dimension in dimensions:
+        positions = random_positions(n_positions, dimension)
+        boards = [board for board, player, move in positions]
+        players = [player for board, player, move in positions]
+        cells = batch_array(boards)
+        legal = batch_legal_moves(cells, players)
+        played, flipped = batch_play_moves(cells, players, [move for board, player, move in positions])
+        scores = batch_scores(cells)
+        for k, (board, player, (i, j)) in enumerate(positions):
+            moves = [(int(u), int(v)) for v, u in zip(*legal[k].nonzero())]
+            new_board = reference.play_move(board, player, i, j)
+            ok = sorted(moves) == reference.get_possible_moves(board, player)
+            ok = ok and tuple(map(tuple, played[k].tolist())) == new_board
+            ok = ok and flipped[k] == sum(len(line) for line in reference.find_lines(board, i, j, player))
+            ok = ok and tuple(scores[k]) == get_score(board)
+            errors += not ok
+    return errors
+
+
+def batch_benchmark(dimension, backend, sizes = (1, 100, 10000)):
+    """
+    Time legal moves, one move played and the score for every position,
+    once with the batch functions and once looping over backend, and print
+    the positions per second of both.
+    """
+    print("batch {}x{}, loop with {}".format(dimension, dimension, backend.name))
+    print("{:>8} {:>14} {:>14} {:>8}".format("boards", "batch pos/s", "loop pos/s", "speedup"))
+    for size in sizes:
+        positions = random_positions(size, dimension)
+        boards = [board for board, player, move in positions]
+        players = [player for board, player, move in positions]
+        moves = [move for board, player, move in positions]
+        repeat = max(1, 10000 // size)
+
+        start = time.perf_counter()
+        for k in range(repeat):
+            cells = batch_array(boards)
+            batch_legal_moves(cells, players)
+            batch_play_moves(cells, players, moves)
+            batch_scores(cells)
+        batch_time = (time.perf_counter() - start) / repeat
+
+        start = time.perf_counter()
+        for k in range(repeat):
+            for board, player, (i, j) in positions:
+                backend.get_possible_moves(board, player)
+                backend.play_move(board, player, i, j)
+                get_score(board)
+        loop_time = (time.perf_counter() - start) / repeat
+        print("{:>8} {:>14.0f} {:>14.0f} {:7.2f}x".format(size, size / batch_time, size / loop_time, loop_time / batch_time))
+
+
+def main(argv):
+
+    dimension = 8
+    max_depth = 6
+    backend = "tuples"
+    batch = False
+    usage = 'perft.py [-d <dimension> -n <max-depth> -b <backend>,...|all --batch]'
+
+    try:
+        opts, args = getopt.getopt(argv,"hd:n:b:",["dimension=","depth=","backend=","batch"])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-d", "--dimension"):
+            dimension = int(arg)
+        elif opt in ("-n", "--depth"):
+            max_depth = int(arg)
+        elif opt in ("-b", "--backend"):
+            backend = arg
+        elif opt == "--batch":
+            batch = True
+
+    if batch:
+        for name in (available_backends() if backend == "all" else backend.split(",")):
+            batch_benchmark(dimension, load_backend(name))
+        sys.exit()
+
+    names = available_backends() if backend == "all" else backend.split(",")
+    report = []
+    errors = 0
+    for name in names:
+        mismatches = conformance(load_backend(name))
+        print("conformance {}: {}".format(name, "ok" if not mismatches else "{} positions differ".format(mismatches)))
+        start = time.perf_counter()
+        errors += run(dimension, max_depth, load_backend(name)) + mismatches
+        report.append((name, mismatches, time.perf_counter() - start))
+        print()
+    if len(report) > 1:
+        baseline = report[0][2]
+        print("{:10} {:>12} {:>10} {:>8}".format("backend", "conformance", "perft", "speedup"))
+        for name, mismatches, elapsed in report:
+            print("{:10} {:>12} {:9.2f}s {:7.2f}x".format(name, "ok" if not mismatches else "FAIL", elapsed, baseline / elapsed))
+    sys.exit(1 if errors else 0)
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
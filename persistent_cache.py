@@ -0,0 +1,138 @@
+"""
+Persistent transposition entries shared between games. An agent loads the
+file into its cache at startup and merges its deepest entries back into it
+when it receives FINAL, so games against the same opponent start with the
+early and midgame subtrees that were already searched.
+
+The file is a marshal dump of (FORMAT_VERSION, sections) where sections
+maps an evaluation version to its entries, and entries map cache keys to
+cache values whose last item is the depth the value was searched to
+(negative for an unlimited search). Each agent only reads its own section,
+so agent.py and agent2.py can share a file. A file written by another
+format is ignored.
+
+Several agent processes may share the file during a tournament: writers
+merge into their section under an exclusive lock on <path>.lock, copy the
+other sections through unchanged and replace the file atomically, so
+readers never need the lock.
+"""
+import hashlib
+import inspect
+import marshal
+import os
+import sys
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves are still atomic but not serialised
+    fcntl = None
+
+FORMAT_VERSION = 3  # 2: keys carry the player to move, values a bound type; 3: one section per evaluation
+MAX_ENTRIES = 200000
+MIN_DEPTH = 3
+
+
+def source_files(module, files):
+    """
+    Add to files the source file of module and, recursively, of the modules
+    of its folder that it takes functions, classes or modules from.
+    """
+    path = getattr(module, "__file__", None)
+    if path is None:
+        return
+    path = os.path.abspath(path)
+    if path in files:
+        return
+    files.add(path)
+    for value in list(vars(module).values()):
+        if inspect.ismodule(value):
+            other = value
+        elif inspect.isfunction(value) or inspect.isclass(value):
+            other = sys.modules.get(value.__module__)
+        else:
+            continue
+        other_path = getattr(other, "__file__", None)
+        if other_path is not None and os.path.dirname(os.path.abspath(other_path)) == os.path.dirname(path):
+            source_files(other, files)
+
+
+def evaluation_version(*functions):
+    """
+    Return a short fingerprint of the evaluation functions, so entries are
+    discarded whenever the code that produced their values changes. Besides
+    the functions' own code it covers the whole source of their modules and
+    of the project modules those draw on (e.g. stability.py for
+    compute_heuristic), since the callees decide the values too.
+    """
+    digest = hashlib.sha1()
+    files = set()
+    for function in functions:
+        code = function.__code__
+        digest.update(code.co_code)
+        digest.update(repr(code.co_consts).encode("utf-8"))
+        source_files(sys.modules.get(function.__module__), files)
+    for path in sorted(files):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def entry_depth(value):
+    depth = value[-1]
+    return float("inf") if depth < 0 else depth
+
+
+def load_sections(path):
+    """
+    Return the sections stored in path, or an empty dict if the file is
+    missing, unreadable or of another format.
+    """
+    try:
+        with open(path, "rb") as f:
+            file_format, sections = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return {}
+    if file_format != FORMAT_VERSION or not isinstance(sections, dict):
+        return {}
+    return sections
+
+
+def load_cache(path, version):
+    """
+    Return the entries stored in path for the evaluation version, or an
+    empty dict if there are none.
+    """
+    return load_sections(path).get(version, {})
+
+
+def save_cache(path, version, cache, min_depth=MIN_DEPTH, max_entries=MAX_ENTRIES):
+    """
+    Merge the entries of cache searched to at least min_depth into the
+    section of version in the file, keeping the deeper value when both have
+    the same key and the max_entries deepest entries of the section. Other
+    sections are kept as they are. Returns the number of entries written to
+    the section.
+    """
+    with open(path + ".lock", "a") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            sections = load_sections(path)
+            entries = sections.get(version, {})
+            for key, value in cache.items():
+                if entry_depth(value) >= min_depth:
+                    old = entries.get(key)
+                    if old is None or entry_depth(old) < entry_depth(value):
+                        entries[key] = value
+            if len(entries) > max_entries:
+                deepest = sorted(entries, key=lambda k: entry_depth(entries[k]), reverse=True)
+                entries = {key: entries[key] for key in deepest[:max_entries]}
+            sections[version] = entries
+            tmp_path = "{}.{}.tmp".format(path, os.getpid())
+            with open(tmp_path, "wb") as f:
+                marshal.dump((FORMAT_VERSION, sections), f)
+            os.replace(tmp_path, path)
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+    return len(entries)
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+A read-only on-disk position store. Positions are keyed by the 64-bit
+position_hash from othello_shared and map to a fixed-width value, so opening
+books, endgame results or evaluation training data can be looked up from an
+agent without loading them into a dict first.
+
+File layout (all integers little-endian):
+    header   magic, format version, value struct format, record count and
+             number of fan-out bits
+    fan-out  2**bits + 1 uint32 record indices, entry k is the first record
+             whose key has k as its top bits
+    records  count records of uint64 key + value, sorted by key
+
+The file is opened with mmap, so opening costs the same for ten entries or
+ten million, and a lookup is two fan-out reads plus a short binary search
+over a bucket of about count / 2**bits records.
+
+Usage: python3 position_db.py build -O <database> <selfplay shard or .otr record> ...
+       python3 position_db.py bench [-n <lookups>] <database>
+       python3 position_db.py bench [-n <lookups>] --synthetic <entries>
+"""
+import sys, getopt
+import mmap
+import os
+import random
+import struct
+import time
+
+from othello_game import OthelloGameManager
+from othello_shared import PASS, get_score, position_hash
+
+MAGIC = b"OTHPOSDB"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sI16sQI")
+FANOUT_BITS = 16
+KEY = struct.Struct("<Q")
+
+# Value format used by the builder: games seen, dark wins, light wins and the
+# summed final disc differential (dark - light) over those games
+OUTCOME_FORMAT = "<IIIi"
+
+
+class PositionDB(object):
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.mm = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, value_format, self.count, self.bits = HEADER.unpack_from(self.mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError("{} is not a version {} position database.".format(path, FORMAT_VERSION))
+        self.value = struct.Struct(value_format.rstrip(b"\0").decode("ASCII"))
+        self.record_size = KEY.size + self.value.size
+        self.fanout = struct.Struct("<{}I".format((1 << self.bits) + 1))
+        self.records_offset = HEADER.size + self.fanout.size
+        self.shift = 64 - self.bits
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, key):
+        return self.find(key) >= 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.mm.close()
+        self.file.close()
+
+    def find(self, key):
+        """
+        Return the byte offset of the record for key, or -1 if it is missing.
+        """
+        bucket = HEADER.size + (key >> self.shift) * 4
+        lo, hi = struct.unpack_from("<II", self.mm, bucket)
+        mm = self.mm
+        unpack_key = KEY.unpack_from
+        base = self.records_offset
+        size = self.record_size
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            mid_key = unpack_key(mm, base + mid * size)[0]
+            if mid_key < key:
+                lo = mid + 1
+            elif mid_key > key:
+                hi = mid
+            else:
+                return base + mid * size
+        return -1
+
+    def get_raw(self, key):
+        """
+        Return a zero-copy memoryview of the value bytes stored for key, or
+        None. The view must be released before the database is closed.
+        """
+        offset = self.find(key)
+        if offset < 0:
+            return None
+        return memoryview(self.mm)[offset + KEY.size:offset + self.record_size]
+
+    def get(self, key, default=None):
+        """
+        Return the value tuple stored for key.
+        """
+        offset = self.find(key)
+        if offset < 0:
+            return default
+        return self.value.unpack_from(self.mm, offset + KEY.size)
+
+    def lookup(self, board, player):
+        return self.get(position_hash(board, player))
+
+
+def write_db(path, items, value_format, bits=FANOUT_BITS):
+    """
+    Write a database from an iterable of (key, value tuple) pairs. Keys must
+    be unique 64-bit integers. The file is written under a temporary name and
+    renamed, so readers never see a partial database.
+    """
+    value = struct.Struct(value_format)
+    records = sorted((key, value.pack(*v)) for key, v in items)
+    shift = 64 - bits
+    fanout = [0] * ((1 << bits) + 1)
+    for key, packed in records:
+        fanout[(key >> shift) + 1] += 1
+    for k in range(1, len(fanout)):
+        fanout[k] += fanout[k - 1]
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, value_format.encode("ASCII"), len(records), bits))
+        f.write(struct.pack("<{}I".format(len(fanout)), *fanout))
+        previous = None
+        for key, packed in records:
+            if key == previous:
+                raise ValueError("Duplicate key {:016x}.".format(key))
+            previous = key
+            f.write(KEY.pack(key))
+            f.write(packed)
+    os.replace(tmp_path, path)
+    return len(records)
+
+
+def game_positions(dimension, moves):
+    """
+    Replay a game and yield (board, player) for every position in which a
+    move was played, followed by the final board.
+    """
+    game = OthelloGameManager(dimension)
+    for i, j in moves:
+        if game.get_game_state()[1] == PASS:
+            game.pass_turn()
+        yield game.board, game.current_player
+        game.play(i, j)
+    yield game.board, game.current_player
+
+
+def read_games(path):
+    """
+    Yield (dimension, moves) for every game of a game record file (see
+    game_record.py) or of a self-play shard (see selfplay.py).
+    """
+    from game_record import SUFFIX, read_records
+    from selfplay import read_shard
+
+    if path.endswith(SUFFIX):
+        for record in read_records(path):
+            yield record.dimension, record.moves
+    else:
+        yield from read_shard(path)
+
+
+def build_outcome_db(path, game_paths):
+    """
+    Build an OUTCOME_FORMAT database from self-play shards and game record
+    files, aggregating every position that occurs in the games with the
+    games' final results.
+    """
+    stats = {}
+    for game_path in game_paths:
+        for dimension, moves in read_games(game_path):
+            positions = list(game_positions(dimension, moves))
+            dark, light = get_score(positions[-1][0])
+            for board, player in positions:
+                key = position_hash(board, player)
+                entry = stats.get(key)
+                if entry is None:
+                    entry = stats[key] = [0, 0, 0, 0]
+                entry[0] += 1
+                entry[1] += dark > light
+                entry[2] += light > dark
+                entry[3] += dark - light
+    return write_db(path, stats.items(), OUTCOME_FORMAT)
+
+
+def benchmark(path, n_lookups):
+    start = time.perf_counter()
+    db = PositionDB(path)
+    open_time = time.perf_counter() - start
+
+    rng = random.Random(0)
+    hits = [KEY.unpack_from(db.mm, db.records_offset + rng.randrange(db.count) * db.record_size)[0]
+            for k in range(n_lookups)] if db.count else []
+    misses = [rng.getrandbits(64) for k in range(n_lookups)]
+    print("{} entries, {} bytes, opened in {:.3f} ms".format(db.count, os.path.getsize(path), open_time * 1000))
+    for name, keys in (("hit", hits), ("miss", misses)):
+        if not keys:
+            continue
+        start = time.perf_counter()
+        for key in keys:
+            db.get(key)
+        elapsed = time.perf_counter() - start
+        print("{} lookups: {:.0f}/s ({:.2f} us each)".format(name, len(keys) / elapsed, elapsed / len(keys) * 1e6))
+    db.close()
+
+
+def main(argv):
+
+    usage = ('position_db.py build -O <database> <shard or record> ...\n'
+             'position_db.py bench [-n <lookups>] (<database> | --synthetic <entries>)')
+    if not argv or argv[0] not in ("build", "bench"):
+        print(usage)
+        sys.exit(2)
+    command = argv[0]
+    output = None
+    n_lookups = 100000
+    synthetic = 0
+
+    try:
+        opts, args = getopt.getopt(argv[1:],"hO:n:",["output=","lookups=","synthetic="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-O", "--output"):
+            output = arg
+        elif opt in ("-n", "--lookups"):
+            n_lookups = int(arg)
+        elif opt == "--synthetic":
+            synthetic = int(arg)
+
+    if command == "build":
+        if output is None or not args:
+            print(usage)
+            sys.exit(2)
+        start = time.perf_counter()
+        count = build_outcome_db(output, args)
+        print("Wrote {} positions to {} in {:.1f}s".format(count, output, time.perf_counter() - start))
+    elif synthetic:
+        path = "synthetic-{}.posdb".format(synthetic)
+        rng = random.Random(synthetic)
+        keys = set()
+        while len(keys) < synthetic:
+            keys.add(rng.getrandbits(64))
+        start = time.perf_counter()
+        write_db(path, ((key, (1, 0, 0, 0)) for key in keys), OUTCOME_FORMAT)
+        print("Built {} in {:.1f}s".format(path, time.perf_counter() - start))
+        benchmark(path, n_lookups)
+        os.remove(path)
+    elif args:
+        benchmark(args[0], n_lookups)
+    else:
+        print(usage)
+        sys.exit(2)
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
@@ -54,12 +54,12 @@ def run_ai():
         # "SCORE 2 2" or "FINAL 33 31" if the game is over.
         # The first number is the score for player 1 (dark), the second for player 2 (light)
         next_input = input() 
-        status, dark_score_s, light_score_s = next_input.strip().split()
+        status, dark_score_s, light_score_s = next_input.strip().split()[:3]
         dark_score = int(dark_score_s)
         light_score = int(light_score_s)
 
         if status == "FINAL": # Game is over. 
-            print 
+            break 
         else: 
             board = eval(input()) # Read in the input and turn it into a Python
                                   # object. The format is a list of rows. The 
@@ -0,0 +1,308 @@
+"""
+State caching for the searches of agent.py and agent2.py.
+
+Every engine makes one SearchCache with its own move generation functions,
+so engines loaded side by side (see test_runner.py) never share positions.
+It holds two tables, both OrderedDicts:
+    entries     the transposition table, the state cache of the assignment.
+                Keys are (board, color, player to move), values are (move,
+                utility, bound type, depth searched) with a negative depth
+                for an unlimited search, oldest first
+    move_lists  the move lists of the positions seen, shared by a node, its
+                parent's move ordering and the heuristic at the leaves:
+                (board, player) -> the result of get_game_state with a
+                tuple of moves, least recently used first
+
+Both are kept to a memory budget of CACHE_MEMORY bytes (OTHELLO_CACHE_MEMORY
+in megabytes), the move lists getting MOVE_CACHE_SHARE of it. Beyond its
+share a table evicts its oldest entries, see entry_limits. Positions a game
+can no longer reach are dropped before each move, see new_root.
+"""
+import os
+import sys
+from collections import OrderedDict
+
+from othello_shared import GAME_OVER
+from persistent_cache import entry_depth
+
+EXACT, LOWER, UPPER = 0, 1, 2  # The utility is the value, a lower bound or an upper bound
+CACHE_MEMORY = int(float(os.environ.get("OTHELLO_CACHE_MEMORY", 256)) * 2 ** 20)
+MOVE_CACHE_SHARE = 0.25
+ENTRY_OVERHEAD = 100  # bytes of an OrderedDict slot and its ordering links
+opp_col_d = {1: 2, 2: 1}
+
+
+def same_depth(depth, limit):
+    """
+    Whether a value searched to depth can stand in for a search to limit.
+    Only a search to the same depth gives the same value: reusing a deeper
+    one would make results depend on what was searched before. Unlimited
+    searches (negative) all end with the game.
+    """
+    return depth == limit or (depth < 0 and limit < 0)
+
+
+def decides(entry, alpha, beta, limit):
+    """
+    Whether the cache entry settles a node searched with window (alpha, beta)
+    to limit: it must come from a search to the same depth, and a bound
+    must fall outside the window.
+    """
+    move, util, bound, depth = entry
+    if not same_depth(depth, limit):
+        return False
+    return bound == EXACT or (bound == LOWER and util >= beta) or (bound == UPPER and util <= alpha)
+
+
+def generation(board):
+    """
+    Return the generation of a position, its dimension and number of empty
+    squares. A game only ever moves to later generations.
+    """
+    return len(board), sum(row.count(0) for row in board)
+
+
+class SearchCache:
+    """
+    The transposition table and move list cache of one engine, built with
+    the get_game_state and play_move of its backend.
+    """
+
+    def __init__(self, get_game_state, play_move, share_moves=True, memory=CACHE_MEMORY):
+        self.get_game_state = get_game_state
+        self.play_move = play_move
+        # Without an evaluation that counts moves, the nodes alone seldom ask
+        # for the same move list twice and move_lists costs more than it saves
+        self.share_moves = share_moves
+        self.memory = memory  # bytes, see set_memory
+        self.entries = OrderedDict()
+        self.move_lists = OrderedDict()
+        self.limits = {}  # dimension -> (entry bytes, move list entry bytes, entries, move list entries)
+        self.generations = {}  # (dimension, empty squares) -> keys in both tables of positions with that many, see new_root
+        self.stats = {"probes": 0, "hits": 0, "unusable": 0, "stores": 0, "etc_probes": 0, "etc_cutoffs": 0,
+                      "move_probes": 0, "move_hits": 0, "evictions": 0, "move_evictions": 0,
+                      "invalidated": 0}  # reset with reset_stats
+
+    def probe(self, board, color, to_move, alpha, beta, limit):
+        """
+        Return the entry of board with to_move to play if it settles the
+        node (see decides), or None, counting the lookup.
+        """
+        self.stats["probes"] += 1
+        entry = self.entries.get((board, color, to_move))
+        if entry is None:
+            return None
+        if not decides(entry, alpha, beta, limit):
+            self.stats["unusable"] += 1
+            return None
+        self.stats["hits"] += 1
+        return entry
+
+    def best_move(self, board, color, to_move):
+        """
+        Return the best move cached for board with to_move to play, whatever
+        the depth or bound it came with, or None.
+        """
+        entry = self.entries.get((board, color, to_move))
+        return None if entry is None else entry[0]
+
+    def store(self, board, color, to_move, move, util, limit, alpha, beta):
+        """
+        Cache the result of a node searched with window (alpha, beta) to
+        limit. A utility outside the window is only a bound on the value.
+        """
+        if util <= alpha:
+            bound = UPPER
+        elif util >= beta:
+            bound = LOWER
+        else:
+            bound = EXACT
+        self.stats["stores"] += 1
+        key = (board, color, to_move)
+        self.add(self.entries, key, (move, util, bound, limit))
+        # The generation is counted once per node and also covers its move
+        # list, see new_root
+        index = generation(board)
+        keys = self.generations.get(index)
+        if keys is None:
+            keys = self.generations[index] = set()
+        keys.add(key)
+        if self.share_moves:
+            keys.add((board, to_move))
+
+    def transposition_cutoff(self, children, color, to_move, alpha, beta, limit, maximizing):
+        """
+        Enhanced transposition cutoff: return the (move, utility) of the
+        first child, with to_move to play and limit left to search, whose
+        cached value alone fails high at a max node (>= beta) or low at a min
+        node (<= alpha), or None if no cached child does.
+        """
+        for move, next_board in children:
+            self.stats["etc_probes"] += 1
+            entry = self.entries.get((next_board, color, to_move))
+            if entry is not None and decides(entry, alpha, beta, limit) and (entry[1] >= beta if maximizing else entry[1] <= alpha):
+                self.stats["etc_cutoffs"] += 1
+                return (move, entry[1])
+        return None
+
+    def game_state(self, board, player):
+        """
+        get_game_state through move_lists, with the moves as a tuple. When
+        neither player can move, the result is stored for both. Without
+        share_moves this is get_game_state.
+        """
+        if not self.share_moves:
+            return self.get_game_state(board, player)
+        key = (board, player)
+        self.stats["move_probes"] += 1
+        result = self.move_lists.get(key)
+        if result is not None:
+            self.stats["move_hits"] += 1
+            self.move_lists.move_to_end(key)
+            return result
+        moves, state = self.get_game_state(board, player)
+        # A tuple of moves holds no references the garbage collector needs
+        # to follow, unlike a list, so full collections skip the table
+        result = (tuple(moves), state)
+        self.add(self.move_lists, key, result)
+        if result[1] == GAME_OVER:
+            self.add(self.move_lists, (board, opp_col_d[player]), result)
+        return result
+
+    def add(self, table, key, value):
+        """
+        Store value under key in entries or move_lists, evicting the oldest
+        entries beyond the table's share of the memory. A key stored again
+        keeps its place.
+        """
+        table[key] = value
+        limit = self.entry_limits(len(key[0]))[2 if table is self.entries else 3]
+        if len(table) > limit:
+            self.evict(table, limit)
+
+    def evict(self, table, limit):
+        while len(table) > limit:
+            key, value = table.popitem(last=False)
+            keys = self.generations.get(generation(key[0]))
+            if keys is not None:
+                keys.discard(key)
+            self.stats["evictions" if table is self.entries else "move_evictions"] += 1
+
+    def entry_limits(self, dimension):
+        """
+        Return the estimated bytes of a transposition entry and of a move
+        list entry on boards of dimension, and how many of each fit in the
+        memory. A board is counted in full in every entry although entries
+        often share it, so the estimate errs on the large side.
+        """
+        if dimension not in self.limits:
+            row = (0,) * dimension
+            board = (row,) * dimension
+            board_bytes = sys.getsizeof(board) + dimension * sys.getsizeof(row)
+            move = (0, 0)
+            entry_bytes = (ENTRY_OVERHEAD + board_bytes + sys.getsizeof((board, 1, 1))
+                           + sys.getsizeof((move, 0, EXACT, 0)) + sys.getsizeof(move) + sys.getsizeof(0.0))
+            # About dimension moves of a midgame position
+            moves_bytes = (ENTRY_OVERHEAD + board_bytes + sys.getsizeof((board, 1)) + sys.getsizeof(([], 0))
+                           + sys.getsizeof([move] * dimension) + dimension * sys.getsizeof(move))
+            self.limits[dimension] = (entry_bytes, moves_bytes,
+                                      max(1, int(self.memory * (1 - MOVE_CACHE_SHARE) // entry_bytes)),
+                                      max(1, int(self.memory * MOVE_CACHE_SHARE // moves_bytes)))
+        return self.limits[dimension]
+
+    def set_memory(self, megabytes):
+        """
+        Change the memory budget and evict the oldest entries that no longer
+        fit.
+        """
+        self.memory = int(megabytes * 2 ** 20)
+        self.limits.clear()
+        for table, limit_index in ((self.entries, 2), (self.move_lists, 3)):
+            if table:
+                self.evict(table, self.entry_limits(len(next(iter(table))[0]))[limit_index])
+
+    def new_root(self, board, keep_depth=None):
+        """
+        Drop the cached positions that a search from board can never reach.
+        Discs are never removed, so every position with more empty squares
+        than board (an earlier generation) is dead. store indexes the keys
+        of a node by generation, so only the dead entries are visited. Move
+        lists without an entry of their own (those of the heuristic) are not
+        indexed: they are never used again and age out of the LRU order.
+
+        With keep_depth, dead entries searched at least that deep stay in the
+        table until evicted, for a cache file to save (see
+        persistent_cache.py); they are not visited again.
+        """
+        dimension, empties = generation(board)
+        for dead in [index for index in self.generations if index[0] == dimension and index[1] > empties]:
+            for key in self.generations.pop(dead):
+                table = self.entries if len(key) == 3 else self.move_lists
+                value = table.get(key)
+                if value is None or (keep_depth is not None and table is self.entries and entry_depth(value) >= keep_depth):
+                    continue
+                del table[key]
+                self.stats["invalidated"] += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.move_lists.clear()
+        self.generations.clear()
+
+    def memory_used(self):
+        """
+        Return the estimated bytes used by both tables.
+        """
+        total = 0
+        for table, size_index in ((self.entries, 0), (self.move_lists, 1)):
+            if table:
+                total += len(table) * self.entry_limits(len(next(iter(table))[0]))[size_index]
+        return total
+
+    def reset_stats(self):
+        for key in self.stats:
+            self.stats[key] = 0
+
+    def report(self):
+        """
+        Return a one-line summary of stats since the last reset.
+        """
+        stats = self.stats
+        return ("cache {} entries: {} probes, {} hits ({:.1%}), {} other depths or bounds only, {} stores, {} ETC probes, {} ETC cutoffs, {} evicted; "
+                "move lists {} entries: {} probes, {} hits ({:.1%}), {} evicted; "
+                "{} invalidated, about {:.1f} of {:.1f} MB").format(
+            len(self.entries), stats["probes"], stats["hits"], stats["hits"] / max(stats["probes"], 1),
+            stats["unusable"], stats["stores"], stats["etc_probes"], stats["etc_cutoffs"],
+            stats["evictions"], len(self.move_lists), stats["move_probes"], stats["move_hits"],
+            stats["move_hits"] / max(stats["move_probes"], 1), stats["move_evictions"],
+            stats["invalidated"], self.memory_used() / 2 ** 20, self.memory / 2 ** 20)
+
+    def principal_variation(self, board, color, depth):
+        """
+        Return the moves expected from board, following the best moves cached
+        by the search to depth. Stops at a pass or an entry of another search.
+        """
+        pv = []
+        to_move = color
+        while len(pv) < depth:
+            entry = self.entries.get((board, color, to_move))
+            if entry is None or entry[0] is None or entry[3] != depth - len(pv):
+                break
+            pv.append(entry[0])
+            board = self.play_move(board, to_move, entry[0][0], entry[0][1])
+            to_move = opp_col_d[to_move]
+        return pv
+
+    def root_move_scores(self, board, color, depth):
+        """
+        Return (move, score) for the moves of board whose result from the
+        search to depth is cached, the scores as strings with <= or >= for
+        bounds.
+        """
+        scores = []
+        for move in self.get_game_state(board, color)[0]:
+            next_board = self.play_move(board, color, move[0], move[1])
+            entry = self.entries.get((next_board, color, opp_col_d[color]))
+            if entry is not None and entry[3] == depth - 1:
+                scores.append((move, ["", ">=", "<="][entry[2]] + str(entry[1])))
+        return scores
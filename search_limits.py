@@ -0,0 +1,24 @@
+"""
+Node counting and the deadline of timed searches, shared by the tuple
+search of agent.py and agent2.py (through search_runtime.py) and the
+bitboard search of large_board.py, so both stop the same way.
+"""
+import time
+
+search_stats = {"nodes": 0, "depth": 0}  # Nodes expanded, reset by the caller, and the depth of the last finished timed search
+search_deadline = []  # perf_counter() time at which a timed search gives up
+
+
+class SearchTimeout(Exception):
+    pass
+
+
+def count_node():
+    """
+    Count an expanded node and abort a timed search once its deadline has
+    passed. The clock is only read every 64 nodes.
+    """
+    search_stats["nodes"] += 1
+    if search_deadline and not search_stats["nodes"] & 63:
+        if time.perf_counter() > search_deadline[0]:
+            raise SearchTimeout
@@ -0,0 +1,282 @@
+"""
+What agent.py and agent2.py do around their search: timed searches (node
+counting and deadlines are in search_limits.py), INFO lines for the manager, garbage collection and
+allocation reports, and the game loop of play_one_game.
+"""
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+from large_board import select_move_large
+from search_limits import SearchTimeout, count_node, search_deadline, search_stats
+from persistent_cache import MAX_ENTRIES, MIN_DEPTH, load_cache, save_cache
+from time_manager import allocate, parse_time_control
+
+search_info = {"enabled": False, "start": 0.0, "move": None, "score": None}  # INFO lines for the manager, see report_info
+# Cyclic garbage collection in the agent process, OTHELLO_GC:
+#   default  CPython's settings
+#   tuned    freeze everything allocated before the first move (modules,
+#            tables, a loaded cache file) so collections skip it, and collect
+#            the youngest generation every GC_THRESHOLD allocations instead
+#            of every 700
+#   off      tuned, and no collection while a move is searched: the garbage
+#            is collected once the move is sent
+GC_MODE = os.environ.get("OTHELLO_GC", "default")
+GC_THRESHOLD = 50000
+gc_state = {"frozen": False}  # whether the objects alive before the first move are frozen, see reset_gc
+# OTHELLO_TRACEMALLOC=n reports on stderr the n source lines whose allocations
+# grew most during each move, and the peak traced memory
+TRACE_LINES = int(os.environ.get("OTHELLO_TRACEMALLOC", 0))
+move_profile = {"collections": 0, "gc_seconds": 0.0, "gc_start": 0.0, "snapshot": None}  # of the current move, see begin_move
+# Boards above this size are searched on bitboards by large_board.py, with
+# iterative deepening up to the depth limit or within the time control
+LARGE_BOARD = 8
+
+
+def eprint(*args, **kwargs):
+    print(*args, file=sys.stderr, **kwargs)
+
+
+def report_info(board, color, depth, search_cache):
+    """
+    Tell the manager how far the search for the current move has got, if it
+    asked for INFO lines with info=1. The move line still comes last:
+
+        INFO depth <d> score <s> nodes <n> nps <n> time <seconds> pv <i,j> ...
+        INFO depth <d> currmove <i,j> score <s>
+
+    with one currmove line per root move in the cache, its score prefixed by
+    <= or >= when alpha-beta only bounded it. Everything but the score is
+    read from the cache after the search, so with caching off the pv is the
+    best move alone and there are no currmove lines.
+    """
+    if not search_info["enabled"]:
+        return
+    elapsed = time.perf_counter() - search_info["start"]
+    pv = search_cache.principal_variation(board, color, depth) or [search_info["move"]]
+    print("INFO depth {} score {} nodes {} nps {:.0f} time {:.3f} pv {}".format(
+        depth, search_info["score"], search_stats["nodes"], search_stats["nodes"] / max(elapsed, 1e-6), elapsed,
+        " ".join("{},{}".format(*move) for move in pv)))
+    for move, score in search_cache.root_move_scores(board, color, depth):
+        print("INFO depth {} currmove {},{} score {}".format(depth, move[0], move[1], score))
+    sys.stdout.flush()
+
+
+def report_large(board, color, search_cache, depth, move, util):
+    """
+    report_info for a search of large_board.py, which returns its move only
+    once the time is up.
+    """
+    search_info["move"], search_info["score"] = move, util
+    report_info(board, color, depth, search_cache)
+
+
+def select_move_timed(board, color, seconds, search, search_cache):
+    """
+    Search with iterative deepening, search(depth) returning the move of a
+    search to depth, until about seconds have passed or the depth reaches
+    the number of empty squares, and return the move of the deepest search
+    that finished.
+    """
+    empties = sum(row.count(0) for row in board)
+    best_move = search_cache.get_game_state(board, color)[0][0]
+    search_stats["depth"] = 0
+    search_deadline[:] = [time.perf_counter() + seconds]
+    try:
+        for depth in range(1, empties + 1):
+            best_move = search(depth)
+            search_stats["depth"] = depth
+            report_info(board, color, depth, search_cache)
+    except SearchTimeout:
+        pass
+    finally:
+        del search_deadline[:]
+    return best_move
+
+
+def configure_gc():
+    """
+    Apply GC_MODE before the first move of a game.
+    """
+    if GC_MODE not in ("default", "tuned", "off"):
+        raise ValueError("Unknown OTHELLO_GC mode {}, choose default, tuned or off".format(GC_MODE))
+    if GC_MODE != "default":
+        # A pooled agent plays many games in one process: freezing again
+        # would make the garbage of the last game permanent
+        if not gc_state["frozen"]:
+            gc.freeze()
+            gc_state["frozen"] = True
+        gc.set_threshold(GC_THRESHOLD, 10, 10)
+    if time_collections not in gc.callbacks:
+        gc.callbacks.append(time_collections)
+
+
+def reset_gc():
+    """
+    Unfreeze and collect everything when a pooled agent handles RESET, so
+    what is left of the finished game is freed and the next game freezes
+    only what is alive then.
+    """
+    if gc_state["frozen"]:
+        gc.unfreeze()
+        gc_state["frozen"] = False
+    gc.collect()
+
+
+def time_collections(phase, info):
+    if phase == "start":
+        move_profile["gc_start"] = time.perf_counter()
+    else:
+        move_profile["gc_seconds"] += time.perf_counter() - move_profile["gc_start"]
+
+
+def begin_move():
+    """
+    Start the GC and allocation bookkeeping of a move, before its search.
+    """
+    move_profile["collections"] = sum(stat["collections"] for stat in gc.get_stats())
+    move_profile["gc_seconds"] = 0.0
+    if GC_MODE == "off":
+        gc.disable()
+    if TRACE_LINES:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        move_profile["snapshot"] = tracemalloc.take_snapshot()
+
+
+def end_move():
+    """
+    Finish what begin_move started once the move line is written: collect
+    the garbage of the search if the collector was off and report the
+    allocations of the move.
+    """
+    sys.stdout.flush()  # the manager gets the move before any of this
+    collections = sum(stat["collections"] for stat in gc.get_stats()) - move_profile["collections"]
+    if GC_MODE == "off":
+        gc.enable()
+        gc.collect(0)
+    if GC_MODE != "default" or TRACE_LINES:
+        eprint("gc: {} collections during the move, {:.1f} ms collecting{}".format(
+            collections, move_profile["gc_seconds"] * 1000, " with the one after it" if GC_MODE == "off" else ""))
+    if TRACE_LINES:
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+        eprint("allocations: {:.1f} MB traced, peak {:.1f} MB during the move".format(current / 2 ** 20, peak / 2 ** 20))
+        for stat in snapshot.compare_to(move_profile["snapshot"], "lineno")[:TRACE_LINES]:
+            eprint("  ", stat)
+        move_profile["snapshot"] = None
+
+
+def play_game(color, limit, minimax, caching, ordering, options, select_move_minimax, select_move_alphabeta,
+              search_cache, cache_version, evaluate):
+    """
+    The game loop of an agent's play_one_game, with the settings of its
+    configuration line and options the key=value fields after them. The
+    agent's search functions are used up to LARGE_BOARD, large_board.py's
+    with evaluate above it. cache_version identifies the agent's evaluation
+    in a cache file, see persistent_cache.py.
+    """
+    search_info["enabled"] = options.get("info") == "1"
+
+    # Without a depth limit the time control decides how deep to search
+    timed = limit == -1 and "time" in options
+    if timed:
+        per_move, total, increment = parse_time_control(options["time"])
+        eprint("Time Control is", options["time"])
+
+    # Optional cache file shared between games, see persistent_cache.py
+    cache_file = os.environ.get("OTHELLO_CACHE_FILE") if caching == 1 else None
+    min_depth = int(os.environ.get("OTHELLO_CACHE_MIN_DEPTH", MIN_DEPTH))
+    if cache_file:
+        for key, value in load_cache(cache_file, cache_version).items():
+            search_cache.add(search_cache.entries, key, value)
+        eprint("Loaded", len(search_cache.entries), "cache entries from", cache_file)
+    configure_gc()
+    large = None  # whether the board is above LARGE_BOARD, known from the first one
+
+    while True:  # This is the main loop
+        # Read in the current game status, for example:
+        # "SCORE 2 2" or "FINAL 33 31" if the game is over.
+        # The first number is the score for player 1 (dark), the second for player 2 (light)
+        # A manager with a time control adds the seconds left for this move,
+        # for example "SCORE 2 2 9.950"
+        next_input = input()
+        fields = next_input.strip().split()
+        status, dark_score_s, light_score_s = fields[:3]
+        dark_score = int(dark_score_s)
+        light_score = int(light_score_s)
+
+        if status == "FINAL":  # Game is over.
+            if cache_file:
+                save_cache(
+                    cache_file,
+                    cache_version,
+                    search_cache.entries,
+                    min_depth,
+                    int(os.environ.get("OTHELLO_CACHE_MAX_ENTRIES", MAX_ENTRIES)),
+                )
+            break
+        else:
+            board = eval(input())  # Read in the input and turn it into a Python
+            # object. The format is a list of rows. The
+            # squares in each row are represented by
+            # 0 : empty square
+            # 1 : dark disk (player 1)
+            # 2 : light disk (player 2)
+
+            # Select the move and send it to the manager
+            search_cache.reset_stats()
+            # Positions left behind are still saved to the cache file at
+            # FINAL if they were searched deep enough
+            search_cache.new_root(board, keep_depth=min_depth if cache_file else None)
+            begin_move()
+            search_stats["nodes"] = 0
+            search_info["start"] = time.perf_counter()
+            if large is None:
+                large = len(board) > LARGE_BOARD
+                if large:
+                    eprint("Board above {0}x{0}: large_board.py searches it, the minimax, caching and ordering flags do not apply".format(LARGE_BOARD))
+            if timed:
+                moves = search_cache.get_game_state(board, color)[0]
+                seconds = allocate(
+                    float(fields[3]),
+                    per_move,
+                    increment,
+                    sum(row.count(0) for row in board),
+                    len(board) * len(board),
+                    len(moves),
+                )
+            if large:
+                movei, movej = select_move_large(
+                    board,
+                    color,
+                    seconds if timed else None,
+                    limit,
+                    evaluate=evaluate,
+                    report=lambda *result: report_large(board, color, search_cache, *result),
+                )
+            elif timed:
+                if seconds > 0:
+                    if minimax == 1:
+                        search = lambda depth: select_move_minimax(board, color, depth, caching)
+                    else:
+                        search = lambda depth: select_move_alphabeta(board, color, depth, caching, ordering)
+                    movei, movej = select_move_timed(board, color, seconds, search, search_cache)
+                else:
+                    movei, movej = moves[0]
+            elif minimax == 1:  # run this if the minimax flag is given
+                movei, movej = select_move_minimax(board, color, limit, caching)
+            else:  # else run alphabeta
+                movei, movej = select_move_alphabeta(
+                    board, color, limit, caching, ordering
+                )
+            if not timed and not large:
+                report_info(board, color, limit, search_cache)
+            if caching == 1:
+                eprint(search_cache.report())
+
+            print("{} {}".format(movei, movej))
+            end_move()
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Headless self-play generator. Plays games between two engines without the
+GUI or agent subprocesses and streams them into compressed shard files that
+can be used as training or benchmark data.
+
+Every game is stored as a compact record:
+    1 byte   board dimension
+    1 byte   number of moves n (passes are not stored, they are implied
+             whenever the player to move has no legal move)
+    n bytes  moves, each encoded as row * dimension + column, the encoding
+             of game_record.py
+
+Records are appended to gzip shards named selfplay-<first>-<end>.bin.gz that
+hold games first..end-1. A shard is written under a .tmp name and renamed
+once complete, so an interrupted run can be resumed with the same options:
+finished shards are kept and the remaining games are played again from the
+same seeds.
+
+Usage: python3 selfplay.py -n <games> -O <directory> [-d <dimension>
+       -a <agentA> -b <agentB> -l <depth-limit> -c -o -m -w <workers>
+       -s <shard-size> -r <random-opening-plies> --seed <seed>]
+"""
+import sys, getopt
+import gzip
+import importlib
+import os
+import random
+import time
+from multiprocessing import Pool
+
+from game_record import decode_moves, encode_moves
+from othello_game import OthelloGameManager
+from othello_shared import PASS, GAME_OVER
+
+SHARD_PREFIX = "selfplay-"
+SHARD_SUFFIX = ".bin.gz"
+
+engines = [None, None, None]  # per-process engine modules for dark and light
+settings = {}
+
+
+def encode_game(dimension, moves):
+    return bytes([dimension, len(moves)]) + encode_moves(moves, dimension)
+
+
+def read_shard(path):
+    """
+    Yield (dimension, moves) for every game stored in a shard file, where
+    moves is a list of (column, row) tuples.
+    """
+    with gzip.open(path, "rb") as f:
+        data = f.read()
+    pos = 0
+    while pos < len(data):
+        dimension = data[pos]
+        n = data[pos + 1]
+        moves = decode_moves(data[pos + 2:pos + 2 + n], dimension)
+        pos += 2 + n
+        yield dimension, moves
+
+
+def shard_name(first, end):
+    return "{}{:08d}-{:08d}{}".format(SHARD_PREFIX, first, end, SHARD_SUFFIX)
+
+
+def completed_games(directory):
+    """
+    Return the number of games stored in the contiguous run of finished
+    shards starting at game 0. Unfinished .tmp shards and shards after a gap
+    are deleted, their games will be played again.
+    """
+    shards = []
+    for name in os.listdir(directory):
+        if name.startswith(SHARD_PREFIX) and name.endswith(SHARD_SUFFIX + ".tmp"):
+            os.remove(os.path.join(directory, name))
+        elif name.startswith(SHARD_PREFIX) and name.endswith(SHARD_SUFFIX):
+            first, end = name[len(SHARD_PREFIX):-len(SHARD_SUFFIX)].split("-")
+            shards.append((int(first), int(end)))
+    done = 0
+    for first, end in sorted(shards):
+        if first == done:
+            done = end
+        else:
+            os.remove(os.path.join(directory, shard_name(first, end)))
+    return done
+
+
+def load_engine(filename):
+    if filename == "random":
+        return None
+    return importlib.import_module(os.path.splitext(os.path.basename(filename))[0])
+
+
+def init_worker(agent1, agent2, options):
+    engines[1] = load_engine(agent1)
+    engines[2] = load_engine(agent2)
+    settings.update(options)
+
+
+def select_move(color, board, moves, rng):
+    engine = engines[color]
+    if engine is None:
+        return rng.choice(moves)
+    if settings["minimax"]:
+        return engine.select_move_minimax(board, color, settings["limit"], settings["caching"])
+    return engine.select_move_alphabeta(board, color, settings["limit"], settings["caching"], settings["ordering"])
+
+
+def play_one(game_index):
+    """
+    Play game number game_index and return its encoded record. The game only
+    depends on the seed and its index, which is what makes resuming work.
+    """
+    rng = random.Random(settings["seed"] * 1000003 + game_index)
+    game = OthelloGameManager(settings["dimension"])
+    moves = []
+    for engine in engines:
+        # Both tables of search_cache.py, so nothing is carried between games.
+        # Random play, or an engine with only the select_move functions, has
+        # no cache
+        search_cache = getattr(engine, "search_cache", None)
+        if search_cache is not None:
+            search_cache.clear()
+        elif hasattr(engine, "cache"):
+            engine.cache.clear()
+    while True:
+        possible_moves, state = game.get_game_state()
+        if state == GAME_OVER:
+            break
+        elif state == PASS:
+            game.pass_turn()
+            continue
+        if len(moves) < settings["random_plies"]:
+            i, j = rng.choice(possible_moves)
+        else:
+            i, j = select_move(game.current_player, game.board, possible_moves, rng)
+        game.play(i, j)
+        moves.append((i, j))
+    return encode_game(settings["dimension"], moves)
+
+
+def generate(directory, n_games, agent1, agent2, options, workers=1, shard_size=1000):
+    """
+    Play games until directory holds n_games, writing them to rotating
+    shards. Returns the number of games played by this call.
+    """
+    os.makedirs(directory, exist_ok=True)
+    start = completed_games(directory)
+    if start >= n_games:
+        return 0
+    print("Resuming at game {}".format(start) if start else "Starting new run")
+
+    pool = Pool(workers, initializer=init_worker, initargs=(agent1, agent2, options))
+    start_time = time.perf_counter()
+    played = 0
+    shard = None
+    try:
+        for record in pool.imap(play_one, range(start, n_games), chunksize=4):
+            game_index = start + played
+            if shard is None:
+                first = game_index
+                end = min(first - first % shard_size + shard_size, n_games)
+                tmp_path = os.path.join(directory, shard_name(first, end) + ".tmp")
+                shard = gzip.open(tmp_path, "wb")
+            shard.write(record)
+            played += 1
+            if game_index + 1 == end:
+                shard.close()
+                shard = None
+                os.replace(tmp_path, os.path.join(directory, shard_name(first, end)))
+                elapsed = time.perf_counter() - start_time
+                print("{} games, {:.2f} games/s".format(game_index + 1, played / elapsed))
+    finally:
+        if shard is not None:
+            shard.close()
+        pool.terminate()
+    elapsed = time.perf_counter() - start_time
+    print("Played {} games in {:.1f}s ({:.2f} games/s)".format(played, elapsed, played / elapsed))
+    return played
+
+
+def main(argv):
+
+    n_games = 0
+    directory = None
+    size = 8
+    limit = 2
+    ordering = False
+    caching = False
+    minimax = False
+    agent1 = "agent.py"
+    agent2 = "agent.py"
+    workers = os.cpu_count()
+    shard_size = 1000
+    random_plies = 4
+    seed = 0
+    usage = 'selfplay.py -n <games> -O <directory> [-d <dimension> -a <agentA> -b <agentB> -l <depth-limit> -c -o -m -w <workers> -s <shard-size> -r <random-plies> --seed <seed>]'
+
+    try:
+        opts, args = getopt.getopt(argv,"hcmon:O:d:a:b:l:w:s:r:",["games=","output=","dimension=","agent1=","agent2=","limit=","workers=","shard-size=","random-plies=","seed="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-n", "--games"):
+            n_games = int(arg)
+        elif opt in ("-O", "--output"):
+            directory = arg
+        elif opt in ("-o", "--ordering"):
+            ordering = True
+        elif opt in ("-d", "--dimension"):
+            size = int(arg)
+        elif opt in ("-a", "--agent1"):
+            agent1 = arg
+        elif opt in ("-b", "--agent2"):
+            agent2 = arg
+        elif opt in ("-c", "--caching"):
+            caching = True
+        elif opt in ("-m", "--minimax"):
+            minimax = True
+        elif opt in ("-l", "--limit"):
+            limit = int(arg)
+        elif opt in ("-w", "--workers"):
+            workers = int(arg)
+        elif opt in ("-s", "--shard-size"):
+            shard_size = int(arg)
+        elif opt in ("-r", "--random-plies"):
+            random_plies = int(arg)
+        elif opt == "--seed":
+            seed = int(arg)
+
+    if n_games <= 0 or directory is None:
+        print(usage)
+        sys.exit(2)
+
+    options = {"dimension": size, "limit": limit, "minimax": minimax, "caching": int(caching),
+               "ordering": int(ordering), "random_plies": random_plies, "seed": seed}
+    generate(directory, n_games, agent1, agent2, options, workers, shard_size)
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stable discs: discs that can never be flipped again, whatever is played.
+
+A disc cannot be flipped along a line (row, column or diagonal) if that
+line is already full, or if its neighbour on either side along the line is
+the edge of the board or a stable disc of the same color. A disc that is
+safe along all four lines is stable. Starting from no stable discs, that
+rule is applied on the bitboards of othello_bitboard until nothing
+changes, so stability spreads from the corners along the edges and into
+the filled part of the board. It finds most but not all stable discs and
+never counts a disc that could still be flipped.
+
+Run this module to measure the cost of a call on positions from random
+games:
+    python3 stability.py [-d <dimension>] [-n <positions>]
+"""
+import sys, getopt
+import time
+
+from othello_bitboard import DIRECTIONS, get_geometry, shift, to_bitboards
+
+AXES = [((1, 0), (-1, 0)), ((0, 1), (0, -1)), ((1, 1), (-1, -1)), ((1, -1), (-1, 1))]
+
+stability_tables = {}  # dimension -> ([(shift and mask, other shift and mask, edge mask, line masks)] per axis, line of each square per axis)
+
+
+def get_tables(dimension):
+    """
+    Return, for each of the four axes, the bitboard shifts one step along it
+    either way, the squares with the edge of the board right next to them
+    along the axis, and the masks of every line of the board on that axis.
+    Also return for every square the mask of its line on each axis.
+    """
+    if dimension not in stability_tables:
+        steps = get_geometry(dimension)[1]
+        tables = []
+        square_lines = [[] for square in range(dimension * dimension)]
+        for axis in AXES:
+            edge = 0
+            lines = {}
+            for j in range(dimension):
+                for i in range(dimension):
+                    square = 1 << j * dimension + i
+                    for xdir, ydir in axis:
+                        if not (0 <= i + xdir < dimension and 0 <= j + ydir < dimension):
+                            edge |= square
+                    # Squares on the same line share this key
+                    xdir, ydir = axis[0]
+                    key = i * ydir - j * xdir
+                    lines[key] = lines.get(key, 0) | square
+            tables.append((steps[DIRECTIONS.index(axis[0])], steps[DIRECTIONS.index(axis[1])], edge, list(lines.values())))
+            for square in range(dimension * dimension):
+                j, i = divmod(square, dimension)
+                square_lines[square].append(lines[i * axis[0][1] - j * axis[0][0]])
+        stability_tables[dimension] = (tables, square_lines)
+    return stability_tables[dimension]
+
+
+def safe_lines(occupied, dimension):
+    """
+    Return, for each axis, the shifts one step along it either way and the
+    squares that cannot be flipped along it because their line is full or
+    they lie on the edge.
+    """
+    tables, square_lines = get_tables(dimension)
+    empty = ~occupied & (1 << dimension * dimension) - 1
+    if bin(empty).count("1") <= dimension:
+        # Late in the game it is cheaper to clear the lines of the empties
+        unsafe = [0, 0, 0, 0]
+        while empty:
+            low = empty & -empty
+            lines = square_lines[low.bit_length() - 1]
+            for k in range(4):
+                unsafe[k] |= lines[k]
+            empty ^= low
+        return [(forward, backward, edge | occupied & ~unsafe[k])
+                for k, (forward, backward, edge, lines) in enumerate(tables)]
+    axes = []
+    for forward, backward, edge, lines in tables:
+        safe = edge
+        for line in lines:
+            if line & occupied == line:
+                safe |= line
+        axes.append((forward, backward, safe))
+    return axes
+
+
+def stable_bitboard(own, axes):
+    """
+    Return the bitboard of the stable discs among own, given the safe_lines
+    of the board.
+    """
+    stable = 0
+    while True:
+        anchored = own
+        for (step_a, mask_a), (step_b, mask_b), safe in axes:
+            anchored &= safe | shift(stable, step_a, mask_a) | shift(stable, step_b, mask_b)
+            if not anchored:
+                break
+        if anchored == stable:
+            return stable
+        stable = anchored
+
+
+def stable_bitboards(dark, light, dimension):
+    """
+    Return the (dark, light) bitboards of the stable discs.
+    """
+    axes = safe_lines(dark | light, dimension)
+    return stable_bitboard(dark, axes), stable_bitboard(light, axes)
+
+
+def count_stable_color(board, player):
+    """
+    Return the number of stable discs of player on board.
+    """
+    dark, light = to_bitboards(board)
+    own = dark if player == 1 else light
+    return bin(stable_bitboard(own, safe_lines(dark | light, len(board)))).count("1")
+
+
+def count_stable(board):
+    """
+    Return the number of stable (dark, light) discs on board.
+    """
+    dark, light = stable_bitboards(*to_bitboards(board), len(board))
+    return bin(dark).count("1"), bin(light).count("1")
+
+
+def benchmark(dimension, n_positions):
+    from perft import random_positions
+    boards = [board for board, player, move in random_positions(n_positions, dimension)]
+    start = time.perf_counter()
+    total = 0
+    for board in boards:
+        dark, light = count_stable(board)
+        total += dark + light
+    elapsed = time.perf_counter() - start
+    print("{}x{}: {:.1f} us per call over {} positions, {:.2f} stable discs on average".format(
+        dimension, dimension, elapsed / len(boards) * 1e6, len(boards), total / len(boards)))
+
+
+def main(argv):
+
+    dimension = 8
+    n_positions = 20000
+    usage = 'stability.py [-d <dimension> -n <positions>]'
+
+    try:
+        opts, args = getopt.getopt(argv,"hd:n:",["dimension=","positions="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-d", "--dimension"):
+            dimension = int(arg)
+        elif opt in ("-n", "--positions"):
+            n_positions = int(arg)
+
+    benchmark(dimension, n_positions)
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+A test runner for search engines over the boards of autograder.py. It runs
+the same correctness checks (expected moves and values) and the timed
+searches of the caching and ordering tests as a matrix of engines, move
+generation backends and cases, in parallel worker processes.
+
+An engine is any module with the functions of agent.py, loaded from its
+file, so agent.py, agent2.py or a new engine are tested the same way. A
+backend is one of othello_shared's (see available_backends), selected
+before the engine is loaded so the engine binds its functions.
+
+Every case is run several times with a fresh cache and timed with
+perf_counter. The report gives the median and the variance of the trials,
+and whether all trials returned the expected result. Timed cases have no
+expected result and only check that every trial agreed. The expected results
+of depth-limited searches assume leaves scored with compute_utility, so
+engines whose search scores them otherwise (agent2.py's compute_heuristic)
+skip those cases. Workers time their cases at the same time, so use -j 1
+when comparing timings closely.
+
+Usage: python3 test_runner.py [-e <engine.py>,...] [-b <backend>,...|all]
+                              [-j <workers>] [-r <trials>] [-k <substring>]
+"""
+import sys, getopt
+import importlib.util
+import os
+import statistics
+import time
+from multiprocessing import Pool
+
+import othello_shared
+
+INF = float("inf")
+
+# boards of size 4
+smallboards = [((0, 0, 0, 0), (0, 2, 1, 0), (0, 1, 1, 1), (0, 0, 0, 0)),
+((0, 1, 0, 0), (0, 1, 1, 0), (0, 1, 2, 1), (0, 0, 0, 2)),
+((0, 0, 0, 0), (0, 2, 1, 0), (0, 1, 1, 1), (0, 1, 1, 0)),
+((0, 1, 0, 0), (0, 2, 2, 0), (0, 1, 2, 1), (0, 0, 2, 2)),
+((1, 0, 0, 2), (1, 1, 2, 0), (1, 1, 1, 1), (1, 2, 2, 2)),
+((0, 1, 0, 0), (0, 1, 1, 0), (2, 2, 2, 1), (0, 0, 0, 2))]
+
+# boards of size 6
+bigboards = [((0, 0, 0, 0, 0, 0), (0, 0, 2, 2, 0, 0), (0, 1, 1, 2, 2, 0), (2, 2, 1, 2, 0, 0), (0, 1, 0, 1, 2, 0), (0, 0, 0, 0, 0, 0)),
+((0, 0, 0, 0, 0, 0), (0, 0, 1, 2, 0, 0), (0, 1, 1, 1, 1, 0), (2, 2, 1, 2, 0, 0), (0, 1, 0, 1, 2, 0), (0, 0, 0, 0, 0, 0)),
+((0, 0, 0, 0, 1, 0), (0, 0, 1, 1, 0, 0), (0, 1, 1, 1, 1, 0), (2, 2, 1, 2, 0, 0), (0, 2, 0, 1, 2, 0), (0, 0, 2, 2, 1, 0)),
+((0, 0, 0, 0, 0, 0), (0, 0, 0, 2, 0, 0), (0, 1, 2, 2, 2, 0), (0, 2, 2, 2, 0, 0), (0, 1, 0, 0, 0, 0), (0, 0, 0, 0, 0, 0)),
+((0, 0, 0, 0, 0, 0), (0, 0, 0, 2, 0, 0), (0, 1, 2, 1, 1, 0), (0, 2, 2, 2, 0, 0), (0, 1, 0, 0, 0, 0), (0, 0, 0, 0, 0, 0))]
+
+
+def build_cases():
+    """
+    Return the cases as (name, engine function, arguments, expected result,
+    whether the result depends on leaves scored with compute_utility) with
+    None as the result of timed cases. The expected results are those of
+    autograder.py.
+    """
+    cases = []
+    utilities = [3, 3, 5, -2, 3, 0]
+    for i, board in enumerate(smallboards):
+        cases.append(("utility small{} dark".format(i), "compute_utility", (board, 1), utilities[i], False))
+        cases.append(("utility small{} light".format(i), "compute_utility", (board, 2), -utilities[i], False))
+    moves = {1: [(0, 0), (2, 3), (0, 0), (3, 0), (3, 1), (0, 3)], 2: [(3, 3), (3, 1), (3, 3), (0, 2), (3, 1), (0, 0)]}
+    for function in ["select_move_minimax", "select_move_alphabeta"]:
+        for i, board in enumerate(smallboards):
+            for color in [1, 2]:
+                cases.append(("{} small{} color {} depth 6".format(function, i, color), function, (board, color, 6), moves[color][i], True))
+    # Depth 1 nodes, only on boards without ties for the max nodes
+    min_answers = {1: [((2, 4), -10), ((1, 1), -4), ((3, 0), -6), ((0, 1), -8), ((5, 2), -6)],
+                   2: [((3, 0), -6), ((5, 5), -8), ((1, 5), -12), ((5, 2), -2), ((3, 4), -4)]}
+    max_answers = {1: {1: ((5, 5), 8), 2: ((1, 5), 12), 4: ((3, 4), 4)},
+                   2: {1: ((1, 1), 4), 2: ((3, 0), 6), 4: ((5, 2), 6)}}
+    for color in [1, 2]:
+        for i, board in enumerate(bigboards):
+            cases.append(("alphabeta_min_node big{} color {}".format(i, color), "alphabeta_min_node", (board, color, -INF, INF, 1, 0, 0), min_answers[color][i], True))
+            cases.append(("minimax_min_node big{} color {}".format(i, color), "minimax_min_node", (board, color, 1, 0), min_answers[color][i], True))
+        for i, answer in max_answers[color].items():
+            cases.append(("alphabeta_max_node big{} color {}".format(i, color), "alphabeta_max_node", (bigboards[i], color, -INF, INF, 1, 0, 0), answer, True))
+            cases.append(("minimax_max_node big{} color {}".format(i, color), "minimax_max_node", (bigboards[i], color, 1, 0), answer, True))
+    # The searches the caching and ordering tests time
+    for i, board in enumerate(bigboards):
+        for caching in [0, 1]:
+            cases.append(("timed alphabeta big{} depth 8 caching {}".format(i, caching), "select_move_alphabeta", (board, 1, 8, caching), None, False))
+        for ordering in [0, 1]:
+            cases.append(("timed alphabeta big{} depth 7 ordering {}".format(i, ordering), "select_move_alphabeta", (board, 1, 7, 0, ordering), None, False))
+    return cases
+
+
+CASES = build_cases()
+
+engines = {}  # (path, backend) -> engine module, per worker process
+
+
+def load_engine(path, backend):
+    """
+    Load the engine module in path with backend selected, so its
+    `from othello_shared import ...` picks up that backend's functions.
+    """
+    key = (path, backend)
+    if key not in engines:
+        othello_shared.use_backend(backend)
+        name = "{}_{}".format(os.path.splitext(os.path.basename(path))[0], backend)
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        engines[key] = module
+    return engines[key]
+
+
+def scores_with_utility(engine):
+    """
+    Whether the engine's search scores the leaves at the depth limit with
+    compute_utility, as the expected results assume.
+    """
+    return all(engine.minimax_max_node(board, color, 0)[1] == engine.compute_utility(board, color)
+               for board in smallboards + bigboards for color in [1, 2])
+
+
+def run_case(task):
+    """
+    Run one case of the matrix trials times. Returns the task with the result
+    of every trial and their times in seconds, or None for both if the case
+    does not apply to the engine.
+    """
+    path, backend, index, trials = task
+    engine = load_engine(path, backend)
+    name, function, args, expected, needs_utility = CASES[index]
+    if needs_utility and not scores_with_utility(engine):
+        return task, None, None
+    results = []
+    times = []
+    for trial in range(trials):
+        search_cache = getattr(engine, "search_cache", None)
+        if search_cache is not None:
+            search_cache.clear()
+        elif hasattr(engine, "cache"):
+            engine.cache.clear()
+        start = time.perf_counter()
+        results.append(getattr(engine, function)(*args))
+        times.append(time.perf_counter() - start)
+    return task, results, times
+
+
+def run_matrix(paths, backends, trials=3, workers=None, pattern=""):
+    """
+    Run every case whose name contains pattern for every engine and backend
+    and print a report. Returns the number of failed cases.
+    """
+    tasks = [(path, backend, index, trials) for path in paths for backend in backends
+             for index, case in enumerate(CASES) if pattern in case[0]]
+    failures = 0
+    current = None
+    passed = total = skipped = 0
+    with Pool(workers or os.cpu_count()) as pool:
+        # imap keeps the order of the tasks, so the report is grouped
+        for (path, backend, index, trials), results, times in pool.imap(run_case, tasks):
+            if (path, backend) != current:
+                if current is not None:
+                    print("{} of {} cases passed, {} skipped\n".format(passed, total, skipped))
+                current = (path, backend)
+                passed = total = skipped = 0
+                print("{} on {}:".format(path, backend))
+            name, function, args, expected, needs_utility = CASES[index]
+            if results is None:
+                skipped += 1
+                print("  {:48} skip  leaves not scored with compute_utility".format(name))
+                continue
+            ok = all(result == results[0] for result in results) and (expected is None or results[0] == expected)
+            total += 1
+            passed += ok
+            failures += not ok
+            print("  {:48} {:4} median {:9.2f} ms  variance {:9.4f} ms^2{}".format(
+                name, "ok" if ok else "FAIL", statistics.median(times) * 1000,
+                statistics.variance(times) * 1e6 if len(times) > 1 else 0.0,
+                "" if ok else "  got {}, expected {}".format(results, expected)))
+    if current is not None:
+        print("{} of {} cases passed, {} skipped\n".format(passed, total, skipped))
+    return failures
+
+
+def main(argv):
+
+    paths = ["agent.py"]
+    backends = [othello_shared.backend_name]
+    workers = None
+    trials = 3
+    pattern = ""
+    usage = 'test_runner.py [-e <engine.py>,... -b <backend>,...|all -j <workers> -r <trials> -k <substring>]'
+
+    try:
+        opts, args = getopt.getopt(argv,"he:b:j:r:k:",["engines=","backends=","workers=","trials=","filter="])
+    except getopt.GetoptError:
+        print(usage)
+        sys.exit(2)
+    for opt, arg in opts:
+        if opt == '-h':
+            print(usage)
+            sys.exit()
+        elif opt in ("-e", "--engines"):
+            paths = arg.split(",")
+        elif opt in ("-b", "--backends"):
+            backends = othello_shared.available_backends() if arg == "all" else arg.split(",")
+        elif opt in ("-j", "--workers"):
+            workers = int(arg)
+        elif opt in ("-r", "--trials"):
+            trials = int(arg)
+        elif opt in ("-k", "--filter"):
+            pattern = arg
+
+    sys.exit(1 if run_matrix(paths, backends, trials, workers, pattern) else 0)
+
+if __name__ == "__main__":
+   main(sys.argv[1:])
@@ -0,0 +1,63 @@
+"""
+Time management for the AI players. A manager with a time control sends it in
+the configuration line ("time=move:10" or "time=game:300+2"), and every
+SCORE line ends with the time left for the current move. allocate() turns
+that into the number of seconds to spend searching the current move.
+"""
+
+SAFETY_MARGIN = 0.05  # seconds kept back for protocol and process overhead
+MOVE_FRACTION = 0.8  # share of a per-move budget that is actually used
+MIN_MOVES_TO_GO = 8  # never plan as if fewer moves were left in the game
+MIDGAME_FACTOR = 1.5  # extra time for the critical middle of the game
+OPENING_FACTOR = 0.6  # less time while the board is still mostly empty
+
+
+def parse_time_control(spec):
+    """
+    Return (per_move, total, increment) for a time control string, the
+    budget per move in seconds or None, and the time for the whole game and
+    the increment after every move.
+    """
+    kind, _, value = spec.partition(":")
+    if kind == "move":
+        return float(value), None, 0.0
+    elif kind == "game":
+        total, _, increment = value.partition("+")
+        return None, float(total), float(increment or 0)
+    raise ValueError("Invalid time control {!r}.".format(spec))
+
+
+def game_phase_factor(empties, squares):
+    """
+    Weight the time of a move by how much is decided on it. Opening moves
+    matter less, the midgame gets the most time and endgame moves are cheap
+    to search exactly once few squares remain.
+    """
+    filled = 1 - empties / squares
+    if filled < 0.25:
+        return OPENING_FACTOR
+    if filled < 0.75:
+        return MIDGAME_FACTOR
+    return 1.0
+
+
+def allocate(time_left, per_move, increment, empties, squares, n_moves):
+    """
+    Return the number of seconds to search the current move.
+    INPUT: the time left for this move as sent by the manager, the time
+    control from parse_time_control, the number of empty and total squares
+    and the number of legal moves
+    OUTPUT: a search time in seconds, 0 means play without searching
+    """
+    if n_moves <= 1:
+        return 0.0
+    usable = time_left - SAFETY_MARGIN
+    if usable <= 0:
+        return 0.0
+    if per_move is not None:
+        return usable * MOVE_FRACTION
+    # Each side plays about half of the remaining empty squares
+    moves_to_go = max(empties // 2, MIN_MOVES_TO_GO)
+    target = (usable / moves_to_go + increment) * game_phase_factor(empties, squares)
+    # Never stake more than a third of the clock on a single move
+    return min(target, usable / 3)